@@ -0,0 +1,194 @@
+"""
+Бенчмарк одного цикла горячих функций market/utils.py против tests/fake_market.py.
+Для каждого числа групп замеряются время, число HTTP-запросов к маркету,
+число запросов к базе и пиковая память (tracemalloc).
+Функции выполняются по порядку одного торгового цикла, каждая работает с результатом предыдущей:
+ордеры -> обновление ордеров -> продажа -> обновление цен -> удаление ордеров -> снятие с продажи.
+Кэши маркета сбрасываются перед каждой функцией.
+
+Отчёт печатается в JSON с постоянным набором полей, чтобы его можно было сравнивать между версиями.
+
+Запуск из каталога steambot:
+    python -m benchmarks.cycle [--groups 10 100 1000 5000] [--output cycle.json]
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import tempfile
+import platform
+import tracemalloc
+from datetime import datetime as dt
+from time import perf_counter
+
+from tests.fake_market import FakeMarket
+
+# версия формата отчёта, меняется только вместе с набором полей
+report_version = 1
+database_methods = ['execute', 'execute_many', 'fetch_all', 'fetch_one', 'fetch_val', 'iterate']
+
+
+class QueryCounter:
+    """Считает вызовы методов databases.Database, через которые ходят ormar и модели."""
+
+    def __init__(self, database):
+        self.count = 0
+        for name in database_methods:
+            setattr(database, name, self.wrap(getattr(database, name), name == 'iterate'))
+
+    def wrap(self, method, generator: bool = False):
+        if generator:
+            def counted(*args, **kwargs):
+                self.count += 1
+                return method(*args, **kwargs)
+        else:
+            async def counted(*args, **kwargs):
+                self.count += 1
+                return await method(*args, **kwargs)
+        return counted
+
+
+def fill(engine, Bot, ItemGroup, groups: int, amount: int):
+    with engine.begin() as connection:
+        connection.execute(Bot.Meta.table.insert(), [{
+            'id': 1, 'state': 'active', 'secret_key': 'secret', 'api_key': 'api',
+            'username': 'user', 'password': 'password', 'steamguard_file': 'guard',
+            'last_ping_pong': dt.now(), 'update_inventory_timestamp': dt.now()
+        }])
+        connection.execute(ItemGroup.Meta.table.insert(), [
+            {
+                'bot': 1, 'state': 'active', 'market_hash_name': f'item {i}',
+                'min_sell_price': 0, 'amount': amount, 'to_order_amount': amount
+            } for i in range(groups)
+        ])
+
+
+async def run(args) -> dict:
+    market = FakeMarket(money=10 ** 12, offers_per_item=args.offers, seed=0)
+    workdir = tempfile.mkdtemp(prefix='steambot-cycle-')
+    # модули бота читают настройки при импорте, поэтому импортируются после запуска маркета
+    os.environ['MARKET_URL'] = await market.start()
+    os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/cycle.db'
+    # ограничение частоты запросов замеряется нагрузочным прогоном, здесь оно только мешает
+    os.environ['MARKET_RPS'] = os.environ['MARKET_BURST'] = str(args.market_rps)
+    # логи в консоли заглушили бы отчёт, они пишутся в файл во временном каталоге
+    os.environ.setdefault('LOG_CONSOLE', '0')
+    os.environ.setdefault('LOG_FILE', f'{workdir}/cycle.log')
+
+    from core.database import database, metadata, engine
+    from core.migrations import migrate
+    from market.models import Bot, ItemGroup
+    from market.cache import search_item_cache, best_buy_offer_cache
+    from market import utils
+    from market.background_tasks import bot_buy
+
+    queries = QueryCounter(database)
+
+    async def delete_all_orders(bot):
+        groups = await ItemGroup.objects.filter(bot=bot).all()
+        await asyncio.gather(*[utils.delete_orders(bot, group) for group in groups])
+
+    async def delete_all_sale_offers(bot):
+        # одного вызова хватает: он снимает все выставленные предметы бота
+        group = await ItemGroup.objects.filter(bot=bot).first()
+        await utils.delete_sale_offers(bot, group)
+
+    def fill_inventory(bot, groups: int):
+        account = market.account(bot.secret_key)
+        for i in range(groups):
+            account.inventory[f'asset{i}'] = {
+                'id': f'asset{i}', 'classid': market.classid(f'item {i}'), 'instanceid': '0',
+                'market_hash_name': f'item {i}', 'market_price': 1, 'tradable': 1
+            }
+
+    # (название, функция цикла, подготовка без замера)
+    scenarios = [
+        ('_group_buy', bot_buy, None),
+        ('update_bots_orders', utils.update_bots_orders, None),
+        ('_group_sell', utils._group_sell, fill_inventory),
+        ('update_selling_items', utils.update_selling_items, None),
+        ('delete_orders', delete_all_orders, None),
+        ('delete_sale_offers', delete_all_sale_offers, None),
+    ]
+
+    results = []
+    try:
+        for groups in args.groups:
+            metadata.drop_all(engine)
+            metadata.create_all(engine)
+            migrate(engine)
+            fill(engine, Bot, ItemGroup, groups, args.amount)
+            market.accounts.clear()
+
+            await database.connect()
+            try:
+                bot = await Bot.objects.get(id=1)
+                for name, func, prepare in scenarios:
+                    if prepare is not None:
+                        prepare(bot, groups)
+                    for cache in (search_item_cache, best_buy_offer_cache, utils.order_books):
+                        cache.clear()
+
+                    requests, db_queries = sum(market.requests.values()), queries.count
+                    if args.memory:
+                        tracemalloc.start()
+                    started = perf_counter()
+                    await func(bot)
+                    wall_time = perf_counter() - started
+                    peak_memory = None
+                    if args.memory:
+                        peak_memory = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+
+                    results.append({
+                        'name': name,
+                        'groups': groups,
+                        'wall_time': round(wall_time, 6),
+                        'http_requests': sum(market.requests.values()) - requests,
+                        'db_queries': queries.count - db_queries,
+                        'peak_memory': peak_memory,
+                    })
+                    print(
+                        f'{name:<22}{groups:>7} groups {wall_time:>9.3f} s '
+                        f'{results[-1]["http_requests"]:>7} http {results[-1]["db_queries"]:>7} db',
+                        file=sys.stderr
+                    )
+            finally:
+                await database.disconnect()
+                await utils.close_sessions()
+    finally:
+        await market.stop()
+
+    return {
+        'version': report_version,
+        'python': platform.python_version(),
+        'parameters': {
+            'amount': args.amount,
+            'offers_per_item': args.offers,
+            'market_rps': args.market_rps,
+            'memory': args.memory,
+        },
+        'results': results,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--groups', type=int, nargs='+', default=[10, 100, 1000, 5000])
+    parser.add_argument('--amount', type=int, default=2, help='amount каждой группы')
+    parser.add_argument('--offers', type=int, default=5, help='предложений о продаже на предмет')
+    parser.add_argument('--market-rps', type=float, default=100000, help='MARKET_RPS бота')
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help='не замерять память: tracemalloc замедляет функции в несколько раз'
+    )
+    parser.add_argument('--output', help='файл для отчёта, по умолчанию stdout')
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(report + '\n')
+    else:
+        print(report)
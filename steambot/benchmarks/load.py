@@ -0,0 +1,169 @@
+"""
+Нагрузочный прогон core.main.main: N ботов по M групп против tests/fake_market.py.
+Steam заменяется на FakeSteamClient, база создаётся во временном каталоге.
+В конце печатается число запросов в секунду, длительность циклов фоновых задач
+и задержка event loop.
+
+Запуск из каталога steambot:
+    python -m benchmarks.load --bots 10 --groups 50 --duration 60 --latency 0.05 --rps 5
+"""
+import os
+import json
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+from tests.fake_market import FakeMarket, FakeSteamClient
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def summary(values: list) -> dict:
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else 0.0,
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+        'max': max(values, default=0.0),
+    }
+
+
+async def monitor_loop_lag(samples: list, interval: float = 0.1):
+    """Насколько позже заданного просыпается sleep: столько event loop был занят."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - started - interval)
+
+
+async def sample_cycles(actors: dict, durations: dict, interval: float = 0.5):
+    """Собирает длительность каждого нового запуска задач акторов."""
+    seen = {}
+    while True:
+        await asyncio.sleep(interval)
+        for bot_id, actor in list(actors.items()):
+            for name, job in actor.scheduler.jobs.items():
+                if job.runs > seen.get((bot_id, name), 0) and job.last_duration is not None:
+                    seen[(bot_id, name)] = job.runs
+                    durations[name].append(job.last_duration)
+
+
+def fill(engine, Bot, ItemGroup, bots: int, groups: int):
+    with engine.begin() as connection:
+        connection.execute(Bot.Meta.table.insert(), [
+            {
+                'id': i, 'state': 'active', 'secret_key': f'secret{i}', 'api_key': f'api{i}',
+                'username': f'user{i}', 'password': 'password', 'steamguard_file': f'guard{i}'
+            } for i in range(1, bots + 1)
+        ])
+        connection.execute(ItemGroup.Meta.table.insert(), [
+            {
+                'bot': bot_id, 'state': 'active', 'market_hash_name': f'item {bot_id}-{i}',
+                'min_sell_price': 0, 'amount': 3, 'to_order_amount': 3
+            } for bot_id in range(1, bots + 1) for i in range(groups)
+        ])
+
+
+async def run(args) -> dict:
+    market = FakeMarket(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, rps=args.rps,
+        fill_rate=args.fill_rate, sell_rate=args.sell_rate, seed=args.seed
+    )
+    workdir = tempfile.mkdtemp(prefix='steambot-load-')
+    # модули бота читают настройки при импорте, поэтому импортируются после запуска маркета
+    os.environ['MARKET_URL'] = await market.start()
+    os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/load.db'
+    os.environ['STEAM_SESSIONS_DIR'] = f'{workdir}/steam_sessions'
+    # telegram-бот в прогоне не запускается, но приложение создаётся при импорте core.main
+    os.environ.setdefault('TELEGRAM_TOKEN', '123456:load-test')
+    # логи в консоли заглушили бы отчёт, они пишутся в файл во временном каталоге
+    os.environ.setdefault('LOG_CONSOLE', '0')
+    os.environ.setdefault('LOG_FILE', f'{workdir}/load.log')
+
+    from core.database import metadata, engine
+    from core.migrations import migrate
+    from core.main import main
+    from market.models import Bot, ItemGroup
+    from market.actors import actors
+    from market.steam import steam_clients
+
+    metadata.create_all(engine)
+    migrate(engine)
+    fill(engine, Bot, ItemGroup, args.bots, args.groups)
+    for bot_id in range(1, args.bots + 1):
+        steam_clients[bot_id] = FakeSteamClient(market, f'secret{bot_id}')
+
+    lag, durations = [], defaultdict(list)
+    monitors = [
+        asyncio.create_task(monitor_loop_lag(lag)),
+        asyncio.create_task(sample_cycles(actors, durations)),
+    ]
+    main_task = asyncio.create_task(main(telegram=False))
+    try:
+        await asyncio.sleep(args.duration)
+        market_stats = market.stats()
+        for actor in list(actors.values()):
+            actor.send('stop')
+        await asyncio.gather(
+            *[actor.task for actor in list(actors.values())], return_exceptions=True
+        )
+    finally:
+        for task in monitors + [main_task]:
+            task.cancel()
+        await asyncio.gather(*monitors, main_task, return_exceptions=True)
+        await market.stop()
+
+    return {
+        'bots': args.bots,
+        'groups_per_bot': args.groups,
+        'duration': args.duration,
+        'market': market_stats,
+        'cycles': {name: summary(values) for name, values in sorted(durations.items())},
+        'loop_lag': summary(lag),
+    }
+
+
+def print_report(report: dict):
+    market = report['market']
+    print(
+        f'{report["bots"]} bots x {report["groups_per_bot"]} groups, {report["duration"]} s\n'
+        f'requests: {market["requests"]}, {market["requests_per_second"]:.1f} req/s, '
+        f'throttled: {market["throttled"]}, errors: {market["errors"]}\n'
+        f'open orders: {market["orders"]}, items on sale: {market["on_sale"]}\n'
+    )
+    print(f'{"cycle, s":<22}{"count":>8}{"mean":>10}{"p50":>10}{"p95":>10}{"max":>10}')
+    rows = list(report['cycles'].items()) + [('event loop lag', report['loop_lag'])]
+    for name, values in rows:
+        print(
+            f'{name:<22}{values["count"]:>8}{values["mean"]:>10.3f}'
+            f'{values["p50"]:>10.3f}{values["p95"]:>10.3f}{values["max"]:>10.3f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--bots', type=int, default=5)
+    parser.add_argument('--groups', type=int, default=20, help='групп на бота')
+    parser.add_argument('--duration', type=float, default=60, help='секунд')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rps', type=float, default=None, help='лимит запросов в секунду на ключ')
+    parser.add_argument('--fill-rate', type=float, default=0.02)
+    parser.add_argument('--sell-rate', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', action='store_true', help='вывести отчёт в JSON')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
@@ -0,0 +1,120 @@
+"""
+Замер фоновых выборок из базы при разном количестве групп предметов.
+На каждого бота приходится одинаковое число групп, поэтому с индексами время выборок
+одного бота не должно расти вместе с общим числом групп.
+
+Запуск из каталога steambot:
+    python -m benchmarks.queries [--groups 100 1000 5000] [--no-indexes]
+"""
+import os
+import asyncio
+import argparse
+import tempfile
+from time import perf_counter
+
+# база бенчмарка создаётся во временном каталоге до импорта моделей
+workdir = tempfile.mkdtemp(prefix='steambot-bench-')
+os.environ['DATABASE_URL'] = f'sqlite:///{workdir}/bench.db'
+os.environ.setdefault('LOG_CONSOLE', '0')
+os.environ.setdefault('LOG_FILE', f'{workdir}/bench.log')
+
+from core.database import database, metadata, engine  # noqa: E402
+from core.migrations import migrate  # noqa: E402
+from market.models import Bot, ItemGroup, Item, get_groups_by_hash_names  # noqa: E402
+
+groups_per_bot = 100
+items_per_group = 2
+repeats = 50
+
+
+def fill(groups: int):
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    bots = max(groups // groups_per_bot, 1)
+    with engine.begin() as connection:
+        connection.execute(Bot.Meta.table.insert(), [
+            {
+                'id': i, 'state': ('active', 'paused', 'sell', 'buy')[i % 4],
+                'secret_key': f'secret{i}', 'api_key': f'api{i}', 'username': f'user{i}',
+                'password': 'password', 'steamguard_file': f'guard{i}'
+            } for i in range(1, bots + 1)
+        ])
+        connection.execute(ItemGroup.Meta.table.insert(), [
+            {
+                'id': i, 'bot': i % bots + 1, 'state': ('active', 'buy', 'sell', 'hold')[i % 4],
+                'market_hash_name': f'item {i}', 'min_sell_price': 0,
+                'amount': 10, 'to_order_amount': 5
+            } for i in range(1, groups + 1)
+        ])
+        connection.execute(Item.Meta.table.insert(), [
+            {
+                'state': 'sold', 'item_group': i % groups + 1,
+                'market_hash_name': f'item {i % groups + 1}'
+            } for i in range(groups * items_per_group)
+        ])
+
+
+def drop_indexes():
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(bind=connection, checkfirst=True)
+
+
+async def measure(name: str, factory) -> tuple:
+    await factory()
+    started = perf_counter()
+    for _ in range(repeats):
+        await factory()
+    return name, (perf_counter() - started) / repeats * 1000
+
+
+async def run_queries(groups: int) -> list:
+    bot = await Bot.objects.get(id=1)
+    hash_names = [group.market_hash_name for group in await ItemGroup.objects.filter(bot=bot).all()]
+    return [
+        await measure('bots by state', lambda: Bot.objects.filter(state='active').all()),
+        await measure(
+            'groups of bot to buy',
+            lambda: ItemGroup.objects.filter(bot=bot).exclude(
+                state__in=['disabled', 'sell', 'hold']
+            ).all()
+        ),
+        await measure(
+            'groups of bot by state',
+            lambda: ItemGroup.objects.filter(bot=bot).filter(state__in=['active', 'buy']).count()
+        ),
+        await measure('groups by hash names', lambda: get_groups_by_hash_names(hash_names[:50], bot)),
+        await measure(
+            'items by hash name',
+            lambda: Item.objects.filter(market_hash_name=hash_names[0]).all()
+        ),
+    ]
+
+
+async def main(sizes: list, indexes: bool):
+    results = {}
+    for groups in sizes:
+        fill(groups)
+        if indexes:
+            migrate(engine)
+        else:
+            drop_indexes()
+        await database.connect()
+        try:
+            results[groups] = await run_queries(groups)
+        finally:
+            await database.disconnect()
+
+    names = [name for name, _ in next(iter(results.values()))]
+    print(f'{"query, ms":<25}' + ''.join(f'{groups:>10}' for groups in sizes))
+    for i, name in enumerate(names):
+        print(f'{name:<25}' + ''.join(f'{results[groups][i][1]:>10.3f}' for groups in sizes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--groups', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--no-indexes', action='store_true', help='сравнить с базой без индексов')
+    args = parser.parse_args()
+    asyncio.run(main(args.groups, not args.no_indexes))
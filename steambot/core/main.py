@@ -2,38 +2,81 @@ import asyncio
 from databases import Database
 
 from core.database import database, metadata, engine
-
-from market.background_tasks import (
-    give_items, take_items, bots_states_check,
-    update_orders_price, update_sell_price, sell, buy
-)
-from telegram_bot.bot import updater
-
-
-async def main():
-    """Все асинхронные задачи"""
-
-    task_bots_states_check = asyncio.create_task(
-        bots_states_check()
-    )
-    task_sell = asyncio.create_task(sell())
-    task_buy = asyncio.create_task(buy())
-    task_take_items = asyncio.create_task(take_items())
-    task_give_items = asyncio.create_task(give_items())
-    task_update_orders_price = asyncio.create_task(
-        update_orders_price()
-    )
-    task_update_sell_price = asyncio.create_task(
-        update_sell_price()
-    )
-
-    await task_bots_states_check
-    await task_buy
-    await task_sell
-    await task_take_items
-    await task_give_items
-    await task_update_orders_price
-    await task_update_sell_price
+from core.migrations import migrate
+
+from market.actors import sync_actors, route_to_workers
+from market.utils import close_sessions
+from core.scheduler import scheduler
+from core.metrics import start_metrics_server, monitor_event_loop
+from core.workers import workers_count, start_workers, stop_workers, check_workers
+from telegram_bot.bot import application
+from telegram_bot.command_handlers import load_allowed_users, allowed_users_refresh
+
+
+def register_jobs(telegram: bool = True, actors: bool = True):
+    """
+    Глобальные фоновые задачи с интервалами запуска в секундах.
+    Работа каждого бота выполняется его собственным актором.
+    telegram=False - пользователи нужны только telegram-боту, их не перечитывают.
+    actors=False - акторы работают в процессах-исполнителях.
+    """
+
+    if actors:
+        scheduler.add_job('sync_actors', sync_actors, 60)
+    if telegram and allowed_users_refresh:
+        scheduler.add_job('load_allowed_users', load_allowed_users, allowed_users_refresh)
+
+
+async def start_telegram():
+    await application.initialize()
+    await application.updater.start_polling(timeout=123)
+    await application.start()
+
+
+async def stop_telegram():
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+
+
+async def main(telegram: bool = True, actors: bool = True):
+    """
+    Все асинхронные задачи и telegram-бот в одном event loop,
+    поэтому команды бота и фоновые задачи пользуются общим подключением к базе.
+    """
+
+    await database_connect(database)
+    register_jobs(telegram, actors)
+    metrics_server = await start_metrics_server()
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    if telegram:
+        await start_telegram()
+
+    try:
+        await scheduler.run()
+    finally:
+        if telegram:
+            await stop_telegram()
+        loop_monitor.cancel()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await close_sessions()
+        await database_disconnect(database)
+
+
+async def supervise(count: int = workers_count):
+    """
+    Режим supervisor (см. core/workers.py): акторы ботов в count процессах,
+    здесь остаются telegram-бот и глобальные задачи.
+    """
+
+    workers = start_workers(count)
+    route_to_workers([worker.control for worker in workers])
+    scheduler.add_job('check_workers', lambda: check_workers(workers), 10)
+    try:
+        await main(actors=False)
+    finally:
+        stop_workers(workers)
 
 
 async def database_connect(db: Database):
@@ -50,9 +93,9 @@ if __name__ == '__main__':
     """Инициализация базы данных"""
 
     metadata.create_all(engine)
+    migrate(engine)
 
-    asyncio.run(database_connect(database))
-
-    updater.start_polling(timeout=123)
-
-    asyncio.run(main())
+    if workers_count > 1:
+        asyncio.run(supervise())
+    else:
+        asyncio.run(main())
@@ -0,0 +1,208 @@
+"""
+Метрики в текстовом формате Prometheus.
+Сервер метрик запускается из core/main.py, если задан METRICS_PORT,
+и отдаёт их по адресу http://METRICS_HOST:METRICS_PORT/metrics.
+"""
+import os
+import asyncio
+from typing import Optional
+
+from aiohttp import web
+
+metrics_host = os.environ.get('METRICS_HOST', '127.0.0.1')
+metrics_port = int(os.environ.get('METRICS_PORT', 0))
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# все метрики по имени, в порядке регистрации
+metrics = {}
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        if name in metrics:
+            raise ValueError(f'Metric {name} is already registered')
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        metrics[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def remove(self, **labels):
+        self.values.pop(self._key(labels), None)
+
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, _format_labels(self.labelnames, key), value
+
+    def render(self) -> str:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}'
+        ]
+        lines.extend(f'{name}{labels} {value}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets=default_buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        if key not in self.values:
+            # [счётчики корзин, сумма, количество]
+            self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        counts, _, _ = state = self.values[key]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in self.values.items():
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield (
+                    f'{self.name}_bucket',
+                    _format_labels(self.labelnames, key, f'le="{bound}"'),
+                    bucket_count
+                )
+            yield f'{self.name}_bucket', _format_labels(self.labelnames, key, 'le="+Inf"'), count
+            yield f'{self.name}_sum', _format_labels(self.labelnames, key), total
+            yield f'{self.name}_count', _format_labels(self.labelnames, key), count
+
+
+def render() -> str:
+    return '\n'.join(metric.render() for metric in metrics.values()) + '\n'
+
+
+market_request_duration = Histogram(
+    'market_request_duration_seconds',
+    'Latency of market.csgo requests',
+    ('endpoint', 'bot')
+)
+market_request_retries = Counter(
+    'market_request_retries_total',
+    'Market requests repeated after an exception',
+    ('endpoint', 'bot')
+)
+market_request_errors = Counter(
+    'market_request_errors_total',
+    'Market requests that failed with an exception or returned an error',
+    ('endpoint', 'bot', 'kind')
+)
+market_throttled = Counter(
+    'market_throttled_total',
+    'Market responses with HTTP 429',
+    ('bot',)
+)
+market_open_orders = Gauge(
+    'market_open_orders',
+    'Buy orders of the bot in the last GetOrders response',
+    ('bot',)
+)
+market_listed_items = Gauge(
+    'market_listed_items',
+    'Items of the bot on sale in the last items response',
+    ('bot',)
+)
+cache_requests = Counter(
+    'market_cache_requests_total',
+    'Lookups in caches of market responses by result (hit or miss)',
+    ('cache', 'result')
+)
+cache_evictions = Counter(
+    'market_cache_evictions_total',
+    'Entries pushed out of caches of market responses by the size limit',
+    ('cache',)
+)
+cache_entries = Gauge(
+    'market_cache_entries',
+    'Entries currently stored in caches of market responses',
+    ('cache',)
+)
+job_duration = Histogram(
+    'job_duration_seconds',
+    'Duration of one run of a background job',
+    ('scheduler', 'job')
+)
+job_lag = Gauge(
+    'job_lag_seconds',
+    'How much later than planned the last run of a background job started',
+    ('scheduler', 'job')
+)
+job_failures = Counter(
+    'job_failures_total',
+    'Background job runs that raised an exception',
+    ('scheduler', 'job')
+)
+job_last_run = Gauge(
+    'job_last_run_timestamp_seconds',
+    'Unix time when the last run of a background job started',
+    ('scheduler', 'job')
+)
+event_loop_lag = Histogram(
+    'event_loop_lag_seconds',
+    'How much later than requested the event loop woke up a sleeping task',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Задержка пробуждения показывает, сколько event loop был занят блокирующим кодом."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(loop.time() - started - interval, 0.0))
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    return web.Response(text=render(), content_type='text/plain')
+
+
+async def start_metrics_server(host: str = metrics_host, port: int = metrics_port) -> Optional[web.AppRunner]:
+    """Возвращает None, если порт не задан."""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,54 @@
+"""
+Миграции схемы базы данных.
+metadata.create_all создаёт только отсутствующие таблицы, поэтому изменения уже существующих
+таблиц (например, новые индексы) применяются здесь.
+Номера применённых миграций хранятся в таблице schema_version.
+Модели должны быть импортированы до вызова migrate, иначе metadata будет пустой.
+"""
+from typing import Callable, List, Tuple
+
+import sqlalchemy
+from sqlalchemy.engine import Connection, Engine
+
+from core.database import metadata, engine
+from logs.logger import log
+
+schema_version = sqlalchemy.Table(
+    'schema_version',
+    sqlalchemy.MetaData(),
+    sqlalchemy.Column('version', sqlalchemy.Integer, primary_key=True),
+)
+
+
+def create_missing_indexes(connection: Connection):
+    """Индексы, объявленные в моделях, но отсутствующие в базе."""
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+
+
+# (номер, описание, функция) в порядке применения, номера только растут
+migrations: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, 'indexes on bots.state, itemgroups(bot, state), items', create_missing_indexes),
+]
+
+
+def current_version(connection: Connection) -> int:
+    return connection.execute(
+        sqlalchemy.select(sqlalchemy.func.max(schema_version.c.version))
+    ).scalar() or 0
+
+
+def migrate(bind: Engine = engine) -> int:
+    """Применяет новые миграции в одной транзакции и возвращает номер версии схемы."""
+    schema_version.create(bind, checkfirst=True)
+    with bind.begin() as connection:
+        version = current_version(connection)
+        for number, description, func in migrations:
+            if number <= version:
+                continue
+            log('Applying migration %s: %s', 'INFO', number, description)
+            func(connection)
+            connection.execute(schema_version.insert().values(version=number))
+            version = number
+    return version
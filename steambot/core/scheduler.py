@@ -0,0 +1,177 @@
+import random
+import asyncio
+from time import monotonic
+from datetime import datetime as dt
+from typing import Awaitable, Callable, Optional
+
+from core.metrics import job_duration, job_lag, job_failures, job_last_run
+from logs.logger import log
+
+
+class Wakeup:
+    """
+    Будильник фоновой задачи: позволяет запустить её раньше срока.
+    """
+
+    def __init__(self):
+        self._event = None
+
+    @property
+    def event(self) -> asyncio.Event:
+        # Event создаётся внутри работающего event loop
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def notify(self):
+        self.event.set()
+
+    async def wait(self, timeout: float):
+        """Ждёт пробуждения не дольше timeout."""
+        if not self.event.is_set():
+            try:
+                await asyncio.wait_for(self.event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.event.clear()
+
+
+class Job:
+    """
+    Периодическая задача.
+    После падения следующий запуск откладывается экспоненциально, но не дольше max_backoff.
+    Через wakeup задачу можно запустить раньше срока.
+    owner - имя планировщика в метриках.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            func: Callable[..., Awaitable],
+            interval: float,
+            jitter: float = 0.1,
+            max_backoff: float = 300,
+            wakeup: Wakeup = None,
+            owner: str = 'main'
+    ):
+        self.name = name
+        self.owner = owner
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max(max_backoff, interval)
+        self.wakeup = wakeup or Wakeup()
+
+        self.task: Optional[asyncio.Task] = None
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_run: Optional[dt] = None
+        self.last_duration: Optional[float] = None
+        self.last_lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def next_delay(self) -> float:
+        delay = self.interval
+        if self.consecutive_failures:
+            delay = min(self.interval * 2 ** self.consecutive_failures, self.max_backoff)
+        return delay + random.uniform(0, delay * self.jitter)
+
+    async def run_once(self):
+        self.running = True
+        self.last_run = dt.now()
+        job_last_run.set(self.last_run.timestamp(), scheduler=self.owner, job=self.name)
+        started = monotonic()
+        try:
+            await self.func()
+            self.consecutive_failures = 0
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = repr(e)
+            job_failures.inc(scheduler=self.owner, job=self.name)
+            log(
+                'Job %s failed (%s in a row): %s', 'ERROR',
+                self.name, self.consecutive_failures, e
+            )
+        finally:
+            self.running = False
+            self.runs += 1
+            self.last_duration = monotonic() - started
+            job_duration.observe(self.last_duration, scheduler=self.owner, job=self.name)
+
+    async def loop(self):
+        while True:
+            await self.run_once()
+            delay = self.next_delay()
+            planned = monotonic() + delay
+            if self.consecutive_failures:
+                # во время backoff задачу не будят
+                await asyncio.sleep(delay)
+            else:
+                await self.wakeup.wait(delay)
+            # при пробуждении раньше срока опоздания нет
+            self.last_lag = max(monotonic() - planned, 0.0)
+            job_lag.set(self.last_lag, scheduler=self.owner, job=self.name)
+
+    def stats(self) -> dict:
+        return {
+            'running': self.running,
+            'runs': self.runs,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_duration': self.last_duration,
+            'last_lag': self.last_lag,
+            'last_error': self.last_error
+        }
+
+
+class Scheduler:
+    """
+    Запускает каждую задачу в собственном цикле, поэтому запуски одной задачи не пересекаются,
+    а упавшая задача перезапускается без рекурсии.
+    name - имя планировщика в метриках задач.
+    """
+
+    def __init__(self, name: str = 'main'):
+        self.name = name
+        self.jobs = {}
+
+    def add_job(self, name: str, func: Callable[..., Awaitable], interval: float, **kwargs) -> Job:
+        if name in self.jobs:
+            raise ValueError(f'Job {name} is already registered')
+        job = Job(name, func, interval, owner=self.name, **kwargs)
+        self.jobs[name] = job
+        return job
+
+    def trigger(self, name: str):
+        """Запустить задачу раньше срока. Если она уже выполняется, то сразу после окончания."""
+        self.jobs[name].wakeup.notify()
+
+    def start(self):
+        for job in self.jobs.values():
+            if job.task is None or job.task.done():
+                job.task = asyncio.create_task(job.loop(), name=job.name)
+
+    async def stop(self):
+        tasks = [job.task for job in self.jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self):
+        self.start()
+        try:
+            await asyncio.gather(*[job.task for job in self.jobs.values()])
+        finally:
+            await self.stop()
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,123 @@
+"""
+Режим supervisor: акторы ботов работают в WORKERS процессах-исполнителях,
+бот с id обслуживается процессом id % WORKERS.
+Процесс supervisor-а запускает исполнителей, держит telegram-бота и перезапускает
+упавшие процессы. Новые статусы ботов передаются исполнителям через их очереди,
+остальное исполнители читают из общей базы.
+Каждый исполнитель пишет логи в свой файл, метрики отдаёт на METRICS_PORT + 1 + номер.
+"""
+import os
+import asyncio
+import pathlib
+import multiprocessing
+from contextlib import contextmanager
+
+from core.metrics import metrics_port
+from logs.logger import log, log_file
+
+workers_count = int(os.environ.get('WORKERS', 0))
+
+# spawn, а не fork: в дочернем процессе не должно остаться копий event loop,
+# подключений к базе и потока записи логов родителя
+spawn_context = multiprocessing.get_context('spawn')
+
+
+@contextmanager
+def environ(values: dict):
+    """Дочерний процесс получает настройки через переменные окружения на время запуска."""
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+class Worker:
+    """Процесс-исполнитель с акторами ботов, у которых bot.id % count == index."""
+
+    def __init__(self, index: int, count: int):
+        self.index = index
+        self.count = count
+        self.control = spawn_context.Queue()
+        self.process = None
+
+    def environ(self) -> dict:
+        path = pathlib.Path(log_file)
+        return {
+            'SHARD_INDEX': str(self.index),
+            'SHARD_COUNT': str(self.count),
+            'LOG_FILE': str(path.with_name(f'{path.stem}.worker{self.index}{path.suffix}')),
+            'METRICS_PORT': str(metrics_port + 1 + self.index if metrics_port else 0),
+        }
+
+    def start(self):
+        self.process = spawn_context.Process(
+            target=run_worker, args=(self.control,), name=f'worker-{self.index}', daemon=True
+        )
+        with environ(self.environ()):
+            self.process.start()
+        log('Worker %s started, pid %s', 'INFO', self.index, self.process.pid)
+
+    def join(self, timeout: float = 30):
+        """Ждёт завершения процесса после None в очереди, затем завершает принудительно."""
+        if self.process is None:
+            return
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+def start_workers(count: int = workers_count) -> list:
+    workers = [Worker(index, count) for index in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def stop_workers(workers: list):
+    for worker in workers:
+        worker.control.put(None)
+    for worker in workers:
+        worker.join()
+
+
+async def check_workers(workers: list):
+    """Перезапускает упавших исполнителей, остальные продолжают работу."""
+    for worker in workers:
+        if not worker.process.is_alive():
+            log(
+                'Worker %s exited with code %s, restarting', 'ERROR',
+                worker.index, worker.process.exitcode
+            )
+            worker.start()
+
+
+async def worker_main(control):
+    """Фоновые задачи ботов своей части без telegram-бота, пока supervisor не пришлёт None."""
+    from core.main import main
+    from market.actors import listen_control
+
+    tasks = [
+        asyncio.create_task(main(telegram=False)),
+        asyncio.create_task(listen_control(control)),
+    ]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        task.result()
+
+
+def run_worker(control):
+    """Точка входа процесса-исполнителя."""
+    try:
+        asyncio.run(worker_main(control))
+    except KeyboardInterrupt:
+        pass
@@ -1,28 +1,123 @@
+import os
+import json
+import queue
+import atexit
 import logging
 import pathlib
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 basedir = pathlib.Path(__file__).parent.parent.absolute()
 
-logger = logging.getLogger('core.main')
-logger.setLevel(logging.INFO)
-file_handler = logging.FileHandler(
-    f'{basedir}/logs/main_logs.log', mode='w'
-)
-formatter = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# text или json
+log_format = os.environ.get('LOG_FORMAT', 'text')
+log_file = os.environ.get('LOG_FILE', f'{basedir}/logs/main_logs.log')
+log_max_bytes = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+log_backups = int(os.environ.get('LOG_BACKUPS', 5))
+log_console = os.environ.get('LOG_CONSOLE', '1') == '1'
+
+levels = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'CRITICAL': logging.CRITICAL,
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RawQueueHandler(QueueHandler):
+    """
+    Кладёт в очередь запись как есть: сообщение, Summary и исключение форматируются
+    обработчиками в потоке QueueListener, а не в event loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class Summary:
+    """
+    Краткое содержание ответа маркета: вместо списков и вложенных словарей пишется их размер.
+    Строится только при записи сообщения.
+    """
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    @staticmethod
+    def _short(value) -> str:
+        if isinstance(value, (list, tuple)):
+            return f'<{len(value)} items>'
+        if isinstance(value, dict):
+            return f'<{len(value)} keys>'
+        return repr(value)
+
+    def __str__(self) -> str:
+        if isinstance(self.payload, dict):
+            return '{' + ', '.join(
+                f'{key!r}: {self._short(value)}' for key, value in self.payload.items()
+            ) + '}'
+        return self._short(self.payload)
+
+
+if log_format == 'json':
+    formatter = JsonFormatter()
+else:
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+file_handler = RotatingFileHandler(
+    log_file, maxBytes=log_max_bytes, backupCount=log_backups, encoding='utf-8'
 )
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+handlers = [file_handler]
+if log_console:
+    handlers.append(logging.StreamHandler())
+for handler in handlers:
+    handler.setFormatter(formatter)
+
+# запись в файл и консоль происходит в отдельном потоке, event loop только кладёт записи в очередь
+log_queue = queue.SimpleQueue()
+listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+listener.start()
+atexit.register(listener.stop)
+
+logger = logging.getLogger('core.main')
+logger.setLevel(levels.get(log_level, logging.INFO))
+logger.addHandler(RawQueueHandler(log_queue))
+logger.propagate = False
 logger.info('Program started!')
 
 
-def log(out: str, level: str = 'INFO'):
-    if level == 'INFO':
-        logger.info(str(out))
-    elif level == 'WARNING':
-        logger.warning(str(out))
-    elif level == 'ERROR':
-        logger.error(str(out))
-    elif level == 'CRITICAL':
-        logger.critical(str(out))
-    print(f'{level}: {str(out)}')
+def log(out, level: str = 'INFO', *args):
+    """
+    args подставляются в out через %, только если сообщение будет записано:
+    log('Response of bot %s: %s', 'DEBUG', bot.id, response)
+    """
+    logger.log(levels[level], out, *args)
+
+
+def log_payload(title: str, payload, *args):
+    """
+    Полный ответ маркета пишется только на уровне DEBUG, на INFO - его краткое содержание.
+    title форматируется с args так же, как в log.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f'{title}:\n%s', *args, payload)
+    else:
+        logger.info(f'{title}: %s', *args, Summary(payload))
@@ -0,0 +1,181 @@
+import os
+import queue
+import asyncio
+from typing import Optional
+
+from core.scheduler import Scheduler, scheduler
+from core.metrics import market_open_orders, market_listed_items
+from .models import Bot
+from .background_tasks import (
+    bot_states_check, bot_sell, bot_buy, update_orders_price,
+    update_sell_price, take_items, give_items
+)
+from .utils import close_bot_session
+from .websocket import MarketWebsocket, push_mode, poll_interval
+from logs.logger import log
+
+
+class BotActor:
+    """
+    Долгоживущая задача одного бота.
+    У актора своя очередь сообщений и свои таймеры для покупки, продажи, ордеров и трейдов,
+    поэтому задержки одного бота не влияют на остальных.
+    Сообщения:
+        ('state', <state>) - новый статус бота,
+        ('bot', <Bot>) - свежая версия бота из базы,
+        ('wake', <job>) - запустить задачу вне очереди,
+        ('stop',) - остановить актора.
+    """
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self.inbox: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.websocket: Optional[asyncio.Task] = None
+
+        self.scheduler = Scheduler(f'bot-{bot.id}')
+        self.scheduler.add_job('states', self._states, 10)
+        self.scheduler.add_job('sell', lambda: bot_sell(self.bot), 10)
+        self.scheduler.add_job('buy', lambda: bot_buy(self.bot), 30)
+        self.scheduler.add_job(
+            'update_orders_price', lambda: update_orders_price(self.bot), poll_interval(5, 60)
+        )
+        self.scheduler.add_job(
+            'update_sell_price', lambda: update_sell_price(self.bot), 3600
+        )
+        self.scheduler.add_job(
+            'take_items', lambda: take_items(self.bot), poll_interval(30, 300)
+        )
+        self.scheduler.add_job(
+            'give_items', lambda: give_items(self.bot), poll_interval(30, 300)
+        )
+
+    async def _states(self):
+        if not await bot_states_check(self.bot):
+            # бот удалён из базы
+            self.send('stop')
+
+    def send(self, *message):
+        self.inbox.put_nowait(message)
+
+    def wake(self, job: str):
+        self.send('wake', job)
+
+    def start(self):
+        self.inbox = asyncio.Queue()
+        self.task = asyncio.create_task(self.run(), name=f'bot-{self.bot.id}')
+
+    async def run(self):
+        self.scheduler.start()
+        if push_mode:
+            self.websocket = asyncio.create_task(
+                MarketWebsocket(self.bot, on_event=self.wake).run()
+            )
+        try:
+            while True:
+                message = await self.inbox.get()
+                if message[0] == 'stop':
+                    break
+                elif message[0] == 'state':
+                    self.bot.state = message[1]
+                    self.scheduler.trigger('states')
+                elif message[0] == 'bot':
+                    state_changed = message[1].state != self.bot.state
+                    self.bot = message[1]
+                    if state_changed:
+                        self.scheduler.trigger('states')
+                elif message[0] == 'wake' and message[1] in self.scheduler.jobs:
+                    self.scheduler.trigger(message[1])
+        finally:
+            if self.websocket is not None:
+                self.websocket.cancel()
+            await self.scheduler.stop()
+            await close_bot_session(self.bot.id)
+            market_open_orders.remove(bot=self.bot.id)
+            market_listed_items.remove(bot=self.bot.id)
+            actors.pop(self.bot.id, None)
+            log('Actor of bot %s stopped', 'INFO', self.bot.id)
+
+
+actors = {}
+# event loop акторов, нужен, чтобы передавать им сообщения из других потоков
+actors_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# процесс обслуживает ботов с bot.id % shard_count == shard_index, см. core/workers.py
+shard_index = int(os.environ.get('SHARD_INDEX', 0))
+shard_count = int(os.environ.get('SHARD_COUNT', 1))
+# очереди процессов-исполнителей, если акторы работают в них, а не в этом процессе
+control_queues: Optional[list] = None
+
+
+def in_shard(bot_id: int) -> bool:
+    return bot_id % shard_count == shard_index
+
+
+async def sync_actors():
+    """
+    Сверяет акторов с ботами в базе: запускает новых и останавливает удалённых.
+    Также доставляет акторам изменения ботов, сделанные в обход send_bot_state.
+    """
+    global actors_loop
+    actors_loop = asyncio.get_running_loop()
+
+    bots = [bot for bot in await Bot.objects.all() if in_shard(bot.id)]
+    bot_ids = {bot.id for bot in bots}
+
+    for bot in bots:
+        actor = actors.get(bot.id)
+        if actor is None:
+            actor = BotActor(bot)
+            actors[bot.id] = actor
+            actor.start()
+        elif (actor.bot.state, actor.bot.secret_key) != (bot.state, bot.secret_key):
+            actor.send('bot', bot)
+
+    for bot_id in set(actors) - bot_ids:
+        actors[bot_id].send('stop')
+
+
+def _deliver_state(bot_id: int, state: str):
+    actor = actors.get(bot_id)
+    if actor is not None:
+        actor.send('state', state)
+    elif 'sync_actors' in scheduler.jobs:
+        scheduler.trigger('sync_actors')
+
+
+def send_bot_state(bot_id: int, state: str):
+    """
+    Сообщает актору бота о новом статусе.
+    Можно вызывать из любого потока, например из обработчиков telegram.
+    Если актора ещё нет, его запустит внеочередная сверка sync_actors.
+    Если акторы работают в процессах-исполнителях, статус уходит процессу бота.
+    """
+    if control_queues:
+        control_queues[int(bot_id) % len(control_queues)].put(('state', int(bot_id), state))
+    elif actors_loop is not None and not actors_loop.is_closed():
+        actors_loop.call_soon_threadsafe(_deliver_state, int(bot_id), state)
+
+
+def route_to_workers(queues: list):
+    """send_bot_state будет передавать статусы в очереди процессов-исполнителей."""
+    global control_queues
+    control_queues = queues
+
+
+async def listen_control(control):
+    """
+    Доставляет акторам сообщения из очереди процесса-исполнителя.
+    ('state', <id бота>, <state>) - новый статус бота, None - остановить процесс.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            # ожидание с таймаутом, чтобы поток не остался висеть после отмены задачи
+            message = await loop.run_in_executor(None, control.get, True, 1)
+        except queue.Empty:
+            continue
+        if message is None:
+            return
+        if message[0] == 'state':
+            _deliver_state(message[1], message[2])
@@ -0,0 +1,144 @@
+import os
+import asyncio
+from time import monotonic
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from core.metrics import cache_requests, cache_evictions, cache_entries
+
+
+class _LoadCancelled(Exception):
+    """Загрузка отменена вместе с задачей, которая её начала."""
+
+
+class TTLCache:
+    """
+    Асинхронный LRU-кэш с временем жизни записей.
+    Одновременные промахи по одному ключу объединяются в один запрос.
+    Кэши с именем name отдают число попаданий, промахов, вытеснений и записей в метрики.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024, name: str = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.name = name
+        self._data = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _count(self, result: str):
+        if result == 'hit':
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.name is not None:
+            cache_requests.inc(cache=self.name, result=result)
+
+    def _report_size(self):
+        if self.name is not None:
+            cache_entries.set(len(self._data), cache=self.name)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires, value = entry
+        if expires <= monotonic():
+            del self._data[key]
+            self._report_size()
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        self._data[key] = (monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+            if self.name is not None:
+                cache_evictions.inc(cache=self.name)
+        self._report_size()
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+        self._report_size()
+
+    def clear(self):
+        self._data.clear()
+        self._report_size()
+
+    async def get_or_load(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]],
+            store: Callable[[Any], bool] = None
+    ) -> Any:
+        """
+        Возвращает значение из кэша или загружает его через loader.
+        store решает, стоит ли сохранять загруженное значение (например, не кэшировать ошибки).
+        Если задачу, начавшую загрузку, отменили, ожидавшие её загружают значение заново.
+        """
+        _missing = object()
+        while True:
+            value = self.get(key, _missing)
+            if value is not _missing:
+                self._count('hit')
+                return value
+
+            pending = self._pending.get(key)
+            if pending is None:
+                break
+            try:
+                value = await asyncio.shield(pending)
+            except _LoadCancelled:
+                continue
+            self._count('hit')
+            return value
+
+        self._count('miss')
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # ожидающие не отменены, они повторят загрузку сами
+            future.set_exception(_LoadCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # помечаем исключение полученным, его обработает вызывающий код
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if store is None or store(value):
+                self.set(key, value)
+            return value
+        finally:
+            self._pending.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+# кэши публичных данных маркета, не зависят от бота
+search_item_cache = TTLCache(
+    ttl=float(os.environ.get('SEARCH_ITEM_TTL', 10)),
+    maxsize=int(os.environ.get('SEARCH_ITEM_CACHE_SIZE', 2048)),
+    name='search-item-by-hash-name'
+)
+best_buy_offer_cache = TTLCache(
+    ttl=float(os.environ.get('BEST_BUY_OFFER_TTL', 4)),
+    maxsize=int(os.environ.get('BEST_BUY_OFFER_CACHE_SIZE', 4096)),
+    name='BestBuyOffer'
+)
+
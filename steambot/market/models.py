@@ -3,6 +3,7 @@ import datetime
 from datetime import timedelta as delta
 
 import ormar
+import sqlalchemy
 from core.database import database, metadata
 
 
@@ -10,6 +11,10 @@ class Bot(ormar.Model):
     class Meta:
         metadata = metadata
         database = database
+        # индексы существующих баз создаются миграциями из core/migrations.py
+        constraints = [
+            ormar.IndexColumns('state', name='ix_bots_state'),
+        ]
 
     id: int = ormar.Integer(primary_key=True)
     description: Optional[str] = ormar.Text(nullable=True)
@@ -47,6 +52,10 @@ class ItemGroup(ormar.Model):
     class Meta:
         metadata = metadata
         database = database
+        # market_hash_name уже проиндексирован ограничением unique
+        constraints = [
+            ormar.IndexColumns('bot', 'state', name='ix_itemgroups_bot_state'),
+        ]
 
     id: int = ormar.Integer(primary_key=True)
 
@@ -64,6 +73,40 @@ class ItemGroup(ormar.Model):
     # количество предметов, оставшихся для создания ордера
     to_order_amount: int = ormar.Integer(default=amount, minimum=0)
 
+    async def add_to_order_amount(self, amount: int, **values):
+        """
+        Изменяет to_order_amount на amount (может быть отрицательным) одним UPDATE,
+        не выходя за пределы от 0 до amount группы.
+        В тот же запрос можно передать другие поля в values.
+        """
+        table = self.Meta.table
+        await self.Meta.database.execute(
+            table.update().where(
+                table.c.id == self.id
+            ).values(
+                to_order_amount=_bounded_to_order_amount(
+                    table, table.c.to_order_amount + amount
+                ),
+                **values
+            )
+        )
+        # локальная копия повторяет изменение без повторного чтения из базы
+        self.to_order_amount = max(0, min(self.amount, self.to_order_amount + amount))
+        for key, value in values.items():
+            setattr(self, key, value)
+
+    async def raise_min_sell_price(self, price: int):
+        """min_sell_price = max(min_sell_price, price) одним UPDATE."""
+        table = self.Meta.table
+        await self.Meta.database.execute(
+            table.update().where(
+                (table.c.id == self.id) & (table.c.min_sell_price < price)
+            ).values(
+                min_sell_price=price
+            )
+        )
+        self.min_sell_price = max(self.min_sell_price, price)
+
     def __str__(self):
         return f"Group of items id is {self.id}.\n" \
                f"Group's state is {self.state}.\n" \
@@ -78,6 +121,10 @@ class Item(ormar.Model):
     class Meta:
         metadata = metadata
         database = database
+        constraints = [
+            ormar.IndexColumns('market_hash_name', name='ix_items_market_hash_name'),
+            ormar.IndexColumns('item_group', 'state', name='ix_items_item_group_state'),
+        ]
 
     id: int = ormar.Integer(primary_key=True)
 
@@ -120,3 +167,56 @@ class User(ormar.Model):
 
     def __str__(self):
         return f"User, with id {self.id} allowed to control bot."
+
+
+def _bounded_to_order_amount(table, value):
+    """Ограничивает новое значение to_order_amount отрезком [0, amount] внутри SQL."""
+    return sqlalchemy.case(
+        (value < 0, 0),
+        (value > table.c.amount, table.c.amount),
+        else_=value
+    )
+
+
+async def get_groups_by_hash_names(hash_names, bot: Bot = None) -> dict:
+    """
+    Группы предметов по market_hash_name, загруженные одним запросом IN.
+    """
+    hash_names = list(set(hash_names))
+    if not hash_names:
+        return {}
+    query = ItemGroup.objects.filter(market_hash_name__in=hash_names)
+    if bot is not None:
+        query = query.filter(bot=bot)
+    return {group.market_hash_name: group for group in await query.all()}
+
+
+async def increment_to_order_amount(counts: dict, bot: Bot = None):
+    """
+    Увеличивает to_order_amount групп на counts[market_hash_name] одним UPDATE:
+    to_order_amount = to_order_amount + CASE market_hash_name WHEN ... END.
+    Значение меняется внутри базы, поэтому параллельные изменения не теряются,
+    и не превышает amount группы.
+    """
+    counts = {name: amount for name, amount in counts.items() if name and amount}
+    if not counts:
+        return
+    table = ItemGroup.Meta.table
+    query = table.update().where(
+        table.c.market_hash_name.in_(list(counts))
+    ).values(
+        to_order_amount=_bounded_to_order_amount(
+            table,
+            table.c.to_order_amount + sqlalchemy.case(
+                # без CAST PostgreSQL выводит тип параметров THEN из market_hash_name
+                {
+                    name: sqlalchemy.cast(amount, sqlalchemy.Integer)
+                    for name, amount in counts.items()
+                },
+                value=table.c.market_hash_name, else_=0
+            )
+        )
+    )
+    if bot is not None:
+        query = query.where(table.c.bot == bot.id)
+    await database.execute(query)
@@ -0,0 +1,117 @@
+import os
+import asyncio
+from time import monotonic
+from collections import deque
+from typing import Optional
+
+# Классы приоритета запросов к маркету: чем меньше число, тем раньше запрос получит токен
+PRIORITY_TRADE = 0
+PRIORITY_ORDER = 1
+PRIORITY_DEFAULT = 2
+PRIORITY_SCAN = 3
+
+# market.csgo ограничивает число запросов в секунду на каждый ключ
+requests_per_second = float(os.environ.get('MARKET_RPS', 5))
+burst = int(os.environ.get('MARKET_BURST', 5))
+# пауза для ключа после ответа 429
+throttle_penalty = float(os.environ.get('MARKET_THROTTLE_PENALTY', 2))
+
+
+class TokenBucket:
+    """
+    Token bucket с приоритетами.
+    Ожидающие запросы стоят в очереди своего приоритета и получают токены по порядку прихода,
+    а очереди с более высоким приоритетом обслуживаются раньше.
+    Ожидающих будит один таймер пополнения, а не каждый запрос сам по себе.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+        # приоритет -> очередь future ожидающих запросов
+        self.waiters = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.timer_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def _can_take(self) -> bool:
+        self._refill()
+        return monotonic() >= self.blocked_until and self.tokens >= 1
+
+    def _first_queue(self) -> Optional[deque]:
+        """Очередь, в начале которой стоит следующий получатель токена. Отменённые выбрасываются."""
+        for priority in sorted(self.waiters):
+            queue = self.waiters[priority]
+            while queue and queue[0].done():
+                queue.popleft()
+            if queue:
+                return queue
+        return None
+
+    def _schedule(self):
+        """Заводит таймер до появления следующего токена, если он ещё не заведён."""
+        loop = asyncio.get_running_loop()
+        if self.timer is not None and self.timer_loop is loop:
+            return
+        delay = max(
+            self.blocked_until - monotonic(),
+            (1 - self.tokens) / self.rate,
+            0
+        )
+        self.timer = loop.call_later(delay, self._wake)
+        self.timer_loop = loop
+
+    def _wake(self):
+        self.timer = None
+        while self._can_take():
+            queue = self._first_queue()
+            if queue is None:
+                return
+            self.tokens -= 1
+            queue.popleft().set_result(None)
+        if self._first_queue() is not None:
+            self._schedule()
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT):
+        if self._first_queue() is None and self._can_take():
+            self.tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(priority, deque()).append(future)
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # токен уже выдан, но запрос отменён: возвращаем токен следующему
+                self.tokens = min(self.capacity, self.tokens + 1)
+                self._wake()
+            raise
+
+    def throttle(self, seconds: float = throttle_penalty):
+        """Маркет ответил 429: сжигаем токены и ждём."""
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, monotonic() + seconds)
+
+
+# один bucket на секретный ключ, общий для всех фоновых задач
+buckets = {}
+
+
+def get_bucket(secret_key: str) -> TokenBucket:
+    bucket = buckets.get(secret_key)
+    if bucket is None:
+        bucket = TokenBucket(requests_per_second, burst)
+        buckets[secret_key] = bucket
+    return bucket
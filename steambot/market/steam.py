@@ -0,0 +1,176 @@
+import os
+import json
+import pathlib
+import asyncio
+import functools
+import importlib.metadata
+from concurrent.futures import ThreadPoolExecutor
+
+from steampy import guard
+from steampy.client import SteamClient
+
+from .models import Bot
+from logs.logger import log
+
+# steampy синхронный, поэтому все его вызовы выполняются в отдельном пуле потоков
+steam_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('STEAM_WORKERS', 4)),
+    thread_name_prefix='steam'
+)
+
+basedir = pathlib.Path(__file__).parent.parent.absolute()
+# cookies залогиненных сессий, чтобы не логиниться заново после перезапуска
+sessions_dir = pathlib.Path(
+    os.environ.get('STEAM_SESSIONS_DIR', f'{basedir}/steam_sessions')
+)
+
+# версии steampy, для которых проверено сохранение сессии (см. _session_jar)
+supported_steampy_versions = ('0.95',)
+try:
+    steampy_version = importlib.metadata.version('steampy')
+except importlib.metadata.PackageNotFoundError:
+    steampy_version = None
+sessions_supported = steampy_version in supported_steampy_versions
+if not sessions_supported:
+    log('Steam sessions are not saved with steampy %s', 'WARNING', steampy_version)
+
+steam_clients = {}
+# сессия steam-клиента не потокобезопасна, поэтому вызовы одного бота идут по очереди
+steam_locks = {}
+
+
+def get_steam_lock(bot_id: int) -> asyncio.Lock:
+    lock = steam_locks.get(bot_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        steam_locks[bot_id] = lock
+    return lock
+
+
+async def run_steam(bot: Bot, func, *args, **kwargs):
+    """
+    Выполняет блокирующий вызов steampy в пуле потоков,
+    не допуская одновременных вызовов для одного бота.
+    """
+    async with get_steam_lock(bot.id):
+        return await asyncio.get_running_loop().run_in_executor(
+            steam_executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+
+def _session_file(bot_id: int) -> pathlib.Path:
+    return sessions_dir / f'steam_session_{bot_id}.json'
+
+
+def _session_jar(steam_client: SteamClient):
+    """
+    Cookies сессии steam-клиента.
+    Публичного способа прочитать их в steampy нет, поэтому это единственное место,
+    где используется его внутренний атрибут, и только для проверенных версий.
+    """
+    return steam_client._session.cookies
+
+
+def save_steam_session(bot_id: int, steam_client: SteamClient):
+    if not sessions_supported:
+        return
+    cookies = [
+        {
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path,
+            'secure': cookie.secure,
+            'expires': cookie.expires
+        }
+        for cookie in _session_jar(steam_client)
+    ]
+    sessions_dir.mkdir(parents=True, exist_ok=True)
+    # в cookies лежат токены аккаунта, файл доступен только владельцу
+    fd = os.open(_session_file(bot_id), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, 'w', encoding='utf-8') as file:
+        json.dump(cookies, file)
+
+
+def delete_steam_session(bot_id: int):
+    try:
+        _session_file(bot_id).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def restore_steam_session(bot: Bot, steam_client: SteamClient) -> bool:
+    """
+    Подставляет сохранённые cookies и steam guard бота в клиент.
+    Возвращает False, если сессии нет или она истекла.
+    """
+    if not sessions_supported:
+        return False
+    try:
+        with open(_session_file(bot.id), encoding='utf-8') as file:
+            cookies = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return False
+
+    steam_client.username = bot.username
+    steam_client.steam_guard_string = bot.steamguard_file
+    steam_client.steam_guard = guard.load_steam_guard(bot.steamguard_file)
+    jar = _session_jar(steam_client)
+    for cookie in cookies:
+        # cookies ставятся с доменами, set_login_cookies лишь помечает клиент залогиненным
+        # и передаёт sessionid в steam_client.market
+        jar.set(**cookie)
+
+    try:
+        steam_client.set_login_cookies({})
+        if steam_client.is_session_alive():
+            return True
+    except Exception as e:
+        log(e, 'WARNING')
+
+    steam_client.was_login_executed = False
+    jar.clear()
+    delete_steam_session(bot.id)
+    return False
+
+
+def login_steam_client(bot: Bot) -> SteamClient:
+    """
+    Выполняется в пуле потоков.
+    Полный логин происходит, только если сохранённая сессия не подошла.
+    """
+    steam_client = SteamClient(bot.api_key)
+    if restore_steam_session(bot, steam_client):
+        log('Steam session of bot %s restored', 'INFO', bot.id)
+        return steam_client
+
+    steam_client.login(bot.username, bot.password, bot.steamguard_file)
+    save_steam_session(bot.id, steam_client)
+    return steam_client
+
+
+async def get_bot_steam_client(bot: Bot) -> SteamClient:
+    """
+    Получение steam-клиента, работающего с данными бота.
+    """
+    if bot.id in steam_clients:
+        return steam_clients[bot.id]
+
+    async with get_steam_lock(bot.id):
+        if bot.id not in steam_clients:
+            # ошибка логина роняет вызвавшую задачу, и планировщик откладывает её с backoff,
+            # а не повторяет логин, удерживая блокировку бота
+            steam_clients[bot.id] = await asyncio.get_running_loop().run_in_executor(
+                steam_executor,
+                functools.partial(login_steam_client, bot)
+            )
+    return steam_clients[bot.id]
+
+
+async def logout_bot_steam_client(bot: Bot):
+    steam_client = steam_clients.pop(bot.id, None)
+    if steam_client is not None:
+        await run_steam(bot, steam_client.logout)
+    delete_steam_session(bot.id)
+    steam_locks.pop(bot.id, None)
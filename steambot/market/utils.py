@@ -1,114 +1,366 @@
 import os
 import logging
 import asyncio
-import requests
+import aiohttp
+from time import monotonic
+from collections import defaultdict
 from dotenv import load_dotenv
 from datetime import datetime as dt, timedelta as delta
 
-from .models import Bot, ItemGroup
-from logs.logger import log
+from .models import Bot, ItemGroup, get_groups_by_hash_names
+from .cache import TTLCache, search_item_cache, best_buy_offer_cache
+from .rate_limit import (
+    get_bucket, PRIORITY_DEFAULT, PRIORITY_ORDER, PRIORITY_SCAN
+)
+from core.metrics import (
+    market_request_duration, market_request_retries, market_request_errors,
+    market_throttled, market_open_orders, market_listed_items
+)
+from logs.logger import log, log_payload
 
 load_dotenv()
 
 logger_name = str(__file__)[str(__file__)[: str(__file__).rfind('\\')].rfind('\\'):]
 module_logger = logging.getLogger(logger_name)
 
+# адрес маркета, можно заменить на локальный сервер (tests/fake_market.py)
+market_url = os.environ.get('MARKET_URL', 'https://market.csgo.com').rstrip('/')
+
+# сколько раз повторять запрос, упавший с исключением, прежде чем отдать ошибку планировщику
+request_retries = int(os.environ.get('MARKET_REQUEST_RETRIES', 5))
+
+# сколько list_hash_name[] передаётся в одном запросе get-list-items-info
+list_items_info_chunk = int(os.environ.get('LIST_ITEMS_INFO_CHUNK', 50))
+
 update_inventory_delta = delta(
     minutes=1
 )
 trade_lock_delta = delta(days=7)
 ping_pong_delta = delta(minutes=3)
+request_timeout = aiohttp.ClientTimeout(total=30)
 
+# асинхронные http-сессии маркета, у каждого бота своя
 sessions = {}
 
 
+def get_bot_session(bot: Bot) -> aiohttp.ClientSession:
+    """
+    Сессия создаётся лениво внутри работающего event loop
+    и переиспользуется всеми запросами бота.
+    """
+    session = sessions.get(bot.id)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(timeout=request_timeout)
+        sessions[bot.id] = session
+    return session
+
+
+async def close_bot_session(bot_id: int):
+    session = sessions.pop(bot_id, None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def close_sessions():
+    for bot_id in list(sessions):
+        await close_bot_session(bot_id)
+
+
+def endpoint_name(url: str) -> str:
+    """Метод API без параметров пути: .../api/BestBuyOffer/1_2/ -> BestBuyOffer."""
+    parts = [part for part in url.partition('/api/')[2].split('/') if part]
+    if parts and parts[0] == 'v2':
+        parts = parts[1:]
+    return parts[0] if parts else url
+
+
 async def send_request_to_market(
         bot: Bot,
         url: str,
         params: dict = None,
         return_error: bool = False,
-        error_recursion: bool = False
+        error_recursion: bool = False,
+        session: aiohttp.ClientSession = None,
+        priority: int = PRIORITY_DEFAULT
 ) -> dict:
     """
     Запросы к market.csgo.
     Перед каждым запросом проверяется, онлайн ли бот.
     Если в процессе запроста появляется ошибка,
     то возвращается её сообшение внутри словаря в ключе 'error'.
+    Сессию нужно передавать явно, если запрос выполняется не в основном event loop.
+    Все запросы с одним секретным ключом проходят через общий rate limiter,
+    запросы с меньшим priority получают квоту первыми.
     """
 
-    def get_bot_session(_bot: Bot) -> requests.Session:
-        global sessions
-        if _bot.id in sessions:
-            return sessions[_bot.id]
-        else:
-            _session = requests.session()
-            sessions[_bot.id] = _session
-            return _session
+    bucket = get_bucket(bot.secret_key)
+    endpoint = endpoint_name(url)
 
-    async def ping(_bot: Bot, _session: requests.Session):
+    def query(_params: dict) -> list:
+        # списки передаются повторяющимся параметром, как это делал requests
+        _query = []
+        for _key, _value in _params.items():
+            if isinstance(_value, (list, tuple)):
+                _query.extend((_key, str(v)) for v in _value)
+            else:
+                _query.append((_key, str(_value)))
+        return _query
+
+    async def get(_session: aiohttp.ClientSession, _url: str, _params: dict) -> dict:
+        _params = query(_params)
+        while True:
+            await bucket.acquire(priority)
+            started = monotonic()
+            async with _session.get(url=_url, params=_params) as _response:
+                if _response.status == 429:
+                    market_throttled.inc(bot=bot.id)
+                    log('Too many requests for bot %s, throttling', 'WARNING', bot.id)
+                    bucket.throttle()
+                    continue
+                _data = await _response.json(content_type=None)
+            market_request_duration.observe(
+                monotonic() - started, endpoint=endpoint_name(_url), bot=bot.id
+            )
+            return _data
+
+    async def ping(_bot: Bot, _session: aiohttp.ClientSession):
         if (dt.now() - _bot.last_ping_pong) >= ping_pong_delta:
             pinged = False
             while not pinged:
-                _response = _session.get(
-                    url='https://market.csgo.com/api/v2/ping',
-                    params={'key': _bot.secret_key}
-                ).json()
+                _response = await get(
+                    _session,
+                    f'{market_url}/api/v2/ping',
+                    {'key': _bot.secret_key}
+                )
                 pinged = _response.get('success', False)
-                log(f'Ping:\n{_response}')
+                log_payload('Ping of bot %s', _response, _bot.id)
                 if not pinged:
                     await asyncio.sleep(10)
             await bot.update(last_ping_pong=dt.now())
 
-    session = get_bot_session(bot)
+    if session is None:
+        session = get_bot_session(bot)
     if params is None:
         params = {}
     if 'key' not in params:
         params['key'] = bot.secret_key
 
-    success = False
-    response = {}
-
-    try:
-
-        while not success:
+    attempt = 0
+    while True:
+        try:
             await ping(bot, session)
-            response = session.get(url=url, params=params).json()
-            if 'error' in response and return_error:
-                return response
-            log(f'Response:\n{response}')
-            success = response.get('success', False)
-            if not success:
-                await asyncio.sleep(10)
+            response = await get(session, url, params)
+            if 'error' in response:
+                market_request_errors.inc(endpoint=endpoint, bot=bot.id, kind='market')
+                if return_error:
+                    return response
+            log_payload('Response of %s for bot %s', response, endpoint, bot.id)
             return response
 
-    except Exception as e:
-        if error_recursion:
+        except Exception as e:
+            market_request_errors.inc(endpoint=endpoint, bot=bot.id, kind='exception')
+            attempt += 1
+            if not error_recursion or attempt > request_retries:
+                raise e
+            market_request_retries.inc(endpoint=endpoint, bot=bot.id)
             log(e, 'ERROR')
-            await asyncio.sleep(10)
-            await send_request_to_market(
-                bot, url, params, return_error, error_recursion
-            )
+            await asyncio.sleep(min(10 * attempt, 60))
+
+
+async def search_item_by_hash_name(bot: Bot, hash_name: str) -> dict:
+    """
+    Предложения о продаже предмета, общие для всех ботов.
+    Ошибки не кэшируются.
+    """
+
+    async def load() -> dict:
+        return await send_request_to_market(
+            bot,
+            f'{market_url}/api/v2/search-item-by-hash-name',
+            {
+                'hash_name': hash_name
+            },
+            error_recursion=True,
+            return_error=True,
+            priority=PRIORITY_SCAN
+        )
+
+    return await search_item_cache.get_or_load(
+        hash_name,
+        load,
+        store=lambda response: response is not None and 'error' not in response
+    )
+
+
+def no_buy_orders(response: dict) -> bool:
+    return 'no buy orders' in str(response.get('error', '')).lower()
+
+
+async def best_buy_offer(bot: Bot, classid: str, instanceid: str) -> dict:
+    """
+    Лучший ордер на покупку предмета.
+    Ошибка "нет ордеров" тоже кэшируется, остальные ошибки (internal, 429) - нет.
+    После изменения своих ордеров запись сбрасывается.
+    """
+
+    async def load() -> dict:
+        return await send_request_to_market(
+            bot,
+            f'{market_url}/api/BestBuyOffer/{classid}_{instanceid}/',
+            error_recursion=True,
+            return_error=True,
+            priority=PRIORITY_SCAN
+        )
+
+    return await best_buy_offer_cache.get_or_load(
+        f'{classid}_{instanceid}',
+        load,
+        store=lambda response: response is not None and (
+            'error' not in response or no_buy_orders(response)
+        )
+    )
+
+
+async def fetch_average_prices(bot: Bot, hash_names: list) -> dict:
+    """
+    Снимок средних цен для всех переданных предметов.
+    Названия отправляются пачками по list_items_info_chunk, пачки запрашиваются одновременно.
+    """
+    hash_names = list(dict.fromkeys(name for name in hash_names if name))
+    chunks = [
+        hash_names[i:i + list_items_info_chunk]
+        for i in range(0, len(hash_names), list_items_info_chunk)
+    ]
+
+    async def fetch_chunk(chunk: list) -> dict:
+        response = await send_request_to_market(
+            bot,
+            f'{market_url}/api/v2/get-list-items-info',
+            params={
+                'list_hash_name[]': chunk
+            },
+            error_recursion=True,
+            return_error=True,
+            priority=PRIORITY_SCAN
+        )
+        if not response or 'error' in response:
+            log('Can not get prices for %s', 'ERROR', chunk)
+            return {}
+        return response.get('data') or {}
+
+    prices = {}
+    for data in await asyncio.gather(*[fetch_chunk(chunk) for chunk in chunks]):
+        prices.update(data)
+    return prices
+
+
+class OrderBook:
+    """
+    Снимок ордеров бота на покупку (GetOrders) с индексами
+    по market_hash_name и по (classid, instanceid).
+    """
+
+    def __init__(self, orders: list):
+        self.orders = orders
+        self.by_hash_name = defaultdict(list)
+        self.by_class_instance = {}
+        for order in orders:
+            self.by_hash_name[order['i_market_hash_name']].append(order)
+            self.by_class_instance[(order['i_classid'], order['i_instanceid'])] = order
+
+    def for_hash_name(self, hash_name: str) -> list:
+        return self.by_hash_name.get(hash_name, [])
+
+    def get(self, classid: str, instanceid: str) -> dict:
+        return self.by_class_instance.get((classid, instanceid))
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __iter__(self):
+        return iter(self.orders)
+
+
+# снимки ордеров по id бота, общие для всех задач в пределах одного цикла
+order_books = TTLCache(ttl=float(os.environ.get('ORDER_BOOK_TTL', 5)), name='GetOrders')
+
+
+async def get_order_book(bot: Bot) -> OrderBook:
+    """
+    Ордеры бота, загруженные одним запросом GetOrders на всех потребителей.
+    Возвращает None, если маркет ответил ошибкой.
+    """
+
+    async def load() -> OrderBook:
+        response = await send_request_to_market(
+            bot,
+            f'{market_url}/api/GetOrders//',
+            error_recursion=True,
+            return_error=True
+        )
+        if 'error' in response:
+            log(response['error'], 'ERROR')
+            return None
+        if response['Orders'] == 'No orders':
+            order_book = OrderBook([])
         else:
-            raise e
+            order_book = OrderBook(response['Orders'])
+        market_open_orders.set(len(order_book), bot=bot.id)
+        return order_book
+
+    return await order_books.get_or_load(
+        bot.id,
+        load,
+        store=lambda order_book: order_book is not None
+    )
+
+
+def invalidate_order_book(bot: Bot):
+    """Вызывается после ProcessOrder, UpdateOrder и InsertOrder."""
+    order_books.invalidate(bot.id)
+
+
+class BalanceSnapshot:
+    """
+    Баланс бота в копейках, полученный один раз за цикл покупки.
+    Деньги резервируются локально перед выставлением ордера
+    и возвращаются, если ордер не был создан.
+    """
+
+    def __init__(self, money: int):
+        self.money = money
+
+    def reserve(self, amount: int) -> bool:
+        # на счету должен остаться хотя бы рубль
+        if self.money - amount >= 100:
+            self.money -= amount
+            return True
+        return False
+
+    def release(self, amount: int):
+        self.money += amount
 
 
 async def bot_balance(bot: Bot):
-    response = await send_request_to_market(
-        bot,
-        'https://market.csgo.com/api/v2/get-money',
-        return_error=True
-    )
-    if 'error' in response:
+    for attempt in range(request_retries):
+        response = await send_request_to_market(
+            bot,
+            f'{market_url}/api/v2/get-money',
+            return_error=True
+        )
+        if 'error' not in response:
+            return response.get('money', 0)
         await asyncio.sleep(10)
-        await bot_balance(bot)
-    return response.get('money', 0)
+    # пока баланс неизвестен, считаем его нулевым, чтобы не создавать ордеров
+    log('Can not get balance of bot %s', 'ERROR', bot.id)
+    return 0
 
 
 async def bot_update_inventory(bot: Bot):
     if (dt.now() - bot.update_inventory_timestamp) >= update_inventory_delta:
         response = await send_request_to_market(
             bot,
-            'https://market.csgo.com/api/v2/update-inventory/',
+            f'{market_url}/api/v2/update-inventory/',
             error_recursion=True,
             return_error=True
         )
@@ -176,58 +428,59 @@ async def bot_group_states_check(bot: Bot, group: ItemGroup):
         await group.delete()
 
 
-async def _group_buy(bot: Bot, group: ItemGroup):
-    log(f'In _group_buy for group {group.market_hash_name}'
-        f' with to_order_amount {group.to_order_amount}')
+async def _group_buy(
+        bot: Bot,
+        group: ItemGroup,
+        prices: dict = None,
+        balance: BalanceSnapshot = None
+):
+    """
+    prices - снимок средних цен из fetch_average_prices, общий для всего цикла покупки,
+    balance - баланс бота, снятый один раз за цикл покупки.
+    Ордеры на все подходящие предметы группы выставляются одновременно.
+    """
+    log(
+        'In _group_buy for group %s with to_order_amount %s', 'INFO',
+        group.market_hash_name, group.to_order_amount
+    )
     if group.to_order_amount > 0:
 
-        log(f'In buy group with market_hash_name {group.market_hash_name}:\n')
+        log('In buy group with market_hash_name %s:', 'INFO', group.market_hash_name)
 
-        items = await send_request_to_market(
-            bot,
-            'https://market.csgo.com/api/v2/search-item-by-hash-name',
-            params={
-                'hash_name': group.market_hash_name
-            },
-            error_recursion=True,
-            return_error=True
-        )
+        items = await search_item_by_hash_name(bot, group.market_hash_name)
         if 'error' in items:
             log(items["error"], 'ERROR')
             return
 
-        response = await send_request_to_market(
-            bot,
-            'https://market.csgo.com/api/v2/get-list-items-info',
-            params={
-                'list_hash_name[]': group.market_hash_name
-            },
-            error_recursion=True
-        )
+        if prices is None:
+            prices = await fetch_average_prices(bot, [group.market_hash_name])
         # средняя цена продажи премета (в копейках)
-        if not response['data']:
+        if group.market_hash_name not in prices:
             return
         average_price = (int(
-            response['data'][group.market_hash_name]['average']
+            prices[group.market_hash_name]['average']
         ) + 1) * 100
 
+        if balance is None:
+            balance = BalanceSnapshot(await bot_balance(bot) * 100)
+
         # используем ограниченное количество предметов, так как их очень много
         # если доступных предметов меньше чем заказанных, то заказываются все доступные предметы
         if group.amount > len(items['data']):
             group.amount = len(items['data'])
+        candidates = items['data'][:group.amount]
+
+        # лучшие ордеры на все предметы запрашиваются одновременно
+        offers = await asyncio.gather(*[
+            best_buy_offer(bot, i['class'], i['instance']) for i in candidates
+        ])
 
-        for i in items['data'][:group.amount]:
+        orders = []
+        for i, response in zip(candidates, offers):
             # нужно дозаказать определённое число предметов
-            if group.to_order_amount <= 0:
+            if len(orders) >= group.to_order_amount:
                 break
 
-            response = await send_request_to_market(
-                bot,
-                f"https://market.csgo.com/api/BestBuyOffer/"
-                f"{i['class']}_{i['instance']}/",
-                error_recursion=True,
-                return_error=True
-            )
             if 'error' in response:
                 log(response['error'], 'ERROR')
                 # если нет других ордеров на покупку этого предмета,
@@ -245,127 +498,152 @@ async def _group_buy(bot: Bot, group: ItemGroup):
                 else:
                     _buy_for = int(i.get('price') * 0.8)
 
-            if await bot_balance(bot) * 100 - _buy_for >= 100:
-                try:
-                    response = await send_request_to_market(
-                        bot,
-                        f"https://market.csgo.com/api/InsertOrder/"
-                        f"{i['class']}/{i['instance']}/{_buy_for}//",
-                        return_error=True
-                    )
+            if balance.reserve(_buy_for):
+                orders.append((i, _buy_for))
 
-                    if 'error' in response:
-                        log(response['error'], 'ERROR')
-                        continue
+        async def insert_order(_item: dict, _buy_for: int) -> bool:
+            try:
+                _response = await send_request_to_market(
+                    bot,
+                    f"{market_url}/api/InsertOrder/"
+                    f"{_item['class']}/{_item['instance']}/{_buy_for}//",
+                    return_error=True,
+                    priority=PRIORITY_ORDER
+                )
+            except Exception as e:
+                log(e, 'ERROR')
+                balance.release(_buy_for)
+                return False
+
+            if 'error' in _response:
+                log(_response['error'], 'ERROR')
+                balance.release(_buy_for)
+                return False
+
+            best_buy_offer_cache.invalidate(f"{_item['class']}_{_item['instance']}")
+            return True
+
+        placed = await asyncio.gather(*[
+            insert_order(i, _buy_for) for i, _buy_for in orders
+        ])
+        placed_prices = [_buy_for for (i, _buy_for), ok in zip(orders, placed) if ok]
+        if placed_prices:
+            invalidate_order_book(bot)
+            await group.add_to_order_amount(-len(placed_prices))
+            await group.raise_min_sell_price(max(placed_prices) + 1)
+
+
+class InventorySnapshot:
+    """
+    Инвентарь бота (my-inventory), сгруппированный по market_hash_name.
+    """
 
-                    else:
-                        group.to_order_amount -= 1
-                        if group.min_sell_price < _buy_for:
-                            group.min_sell_price = _buy_for + 1
+    def __init__(self, items: list):
+        self.items = items
+        self.by_hash_name = defaultdict(list)
+        for item in items:
+            self.by_hash_name[item['market_hash_name']].append(item)
 
-                except Exception as e:
-                    log(e, 'ERROR')
-                    continue
+    def for_hash_name(self, hash_name: str) -> list:
+        return self.by_hash_name.get(hash_name, [])
 
-        await group.update(
-            to_order_amount=group.to_order_amount,
-            min_sell_price=group.min_sell_price
-        )
+    def __len__(self):
+        return len(self.items)
 
 
 async def _group_sell(bot: Bot):
-    group_names = await ItemGroup.objects.filter(bot=bot).exclude(
-        state__in=['disabled', 'buy', 'hold']
-    ).values_list(
-        fields='market_hash_name',
-        flatten=True
-    )
+    """
+    Выставляет на продажу все предметы инвентаря, входящие в группы бота.
+    Каждое название оценивается один раз, предметы выставляются одновременно.
+    """
+    groups = {
+        group.market_hash_name: group
+        for group in await ItemGroup.objects.filter(bot=bot).exclude(
+            state__in=['disabled', 'buy', 'hold']
+        ).all()
+    }
+    if not groups:
+        return
 
-    inventory = await send_request_to_market(
+    response = await send_request_to_market(
         bot,
-        'https://market.csgo.com/api/v2/my-inventory/'
+        f'{market_url}/api/v2/my-inventory/'
     )
-    inventory = inventory.get('items', [])
-
-    for item in inventory:
-        if item['market_hash_name'] in group_names:
-
-            response = await send_request_to_market(
-                bot,
-                'https://market.csgo.com/api/v2/search-item-by-hash-name',
-                {
-                    'hash_name': item['market_hash_name']
-                },
-                error_recursion=True
-            )
+    inventory = InventorySnapshot(response.get('items', []))
 
-            group = await ItemGroup.objects.get(
-                market_hash_name=item['market_hash_name']
-            )
+    hash_names = [name for name in inventory.by_hash_name if name in groups]
+    offers = await asyncio.gather(*[
+        search_item_by_hash_name(bot, name) for name in hash_names
+    ])
 
-            if response['data'][0]['price'] - 1 > int(group.min_sell_price * 1.1):
-                sell_for = response['data'][0]['price'] - 1
-            else:
-                sell_for = int(group.min_sell_price * 1.1)
-
-            response = await send_request_to_market(
-                bot,
-                'https://market.csgo.com/api/v2/add-to-sale',
-                {
-                    'id': item['id'],
-                    'price': sell_for,
-                    'cur': 'RUB'
-                },
-                error_recursion=True,
-                return_error=True
-            )
-            if 'error' in response:
-                await bot_update_inventory(bot)
+    sales = []
+    for hash_name, response in zip(hash_names, offers):
+        if 'error' in response or not response.get('data'):
+            continue
+        group = groups[hash_name]
+
+        if response['data'][0]['price'] - 1 > int(group.min_sell_price * 1.1):
+            sell_for = response['data'][0]['price'] - 1
+        else:
+            sell_for = int(group.min_sell_price * 1.1)
+
+        sales.extend((item, sell_for) for item in inventory.for_hash_name(hash_name))
+
+    async def add_to_sale(_item: dict, _sell_for: int) -> bool:
+        _response = await send_request_to_market(
+            bot,
+            f'{market_url}/api/v2/add-to-sale',
+            {
+                'id': _item['id'],
+                'price': _sell_for,
+                'cur': 'RUB'
+            },
+            error_recursion=True,
+            return_error=True
+        )
+        return 'error' not in _response
+
+    added = await asyncio.gather(*[
+        add_to_sale(item, sell_for) for item, sell_for in sales
+    ])
+    if not all(added):
+        await bot_update_inventory(bot)
 
 
 async def update_bots_orders(bot):
-    log(f'In update_orders_price for bot {bot.id}')
+    log('In update_orders_price for bot %s', 'INFO', bot.id)
 
-    orders = await send_request_to_market(
-        bot,
-        'https://market.csgo.com/api/GetOrders//',
-        error_recursion=True,
-        return_error=True
-    )
-    if 'error' in orders or orders['Orders'] == 'No orders':
+    order_book = await get_order_book(bot)
+    if not order_book:
         return
 
-    for item in orders['Orders']:
+    # баланс запрашивается один раз за проход и только если нашёлся перебитый ордер
+    balance = None
+    for item in order_book:
 
         try:
-            response = await send_request_to_market(
-                bot,
-                f'https://market.csgo.com/api/BestBuyOffer/'
-                f'{item["i_classid"]}_{item["i_instanceid"]}/',
-                return_error=True
-            )
+            response = await best_buy_offer(bot, item['i_classid'], item['i_instanceid'])
             if 'error' in response:
                 continue
             else:
                 best_offer = int(response.get('best_offer'))
 
-            response = await send_request_to_market(
-                bot,
-                'https://market.csgo.com/api/v2/search-item-by-hash-name',
-                {
-                    'hash_name': item['i_market_hash_name']
-                },
-                error_recursion=True
-            )
+            response = await search_item_by_hash_name(bot, item['i_market_hash_name'])
             if response['data']:
                 sell_for = response['data'][0]['price'] - 1
             else:
                 continue
 
+            outbid = (
+                best_offer >= int(item['o_price'])
+                and (best_offer + 1) < int(sell_for * 0.9)
+            )
+            if outbid and balance is None:
+                balance = BalanceSnapshot(await bot_balance(bot) * 100)
+
             if (
-                    best_offer >= int(item['o_price'])
-                    and (best_offer + 1) < int(sell_for * 0.9)
-                    and (best_offer + 1) < await bot_balance(bot) * 100
+                    outbid
+                    and (best_offer + 1) < balance.money
             ) or (
                     # если цена продажи предмета более 500 рублей, то при отмене самого большого ордера на продажу,
                     # исходящего не от нас и отличающегося от нашего холтя бы на 3%,
@@ -376,19 +654,22 @@ async def update_bots_orders(bot):
                 log('In update order:')
                 response = await send_request_to_market(
                     bot,
-                    f'https://market.csgo.com/api/UpdateOrder/'
+                    f'{market_url}/api/UpdateOrder/'
                     f'{item["i_classid"]}/{item["i_instanceid"]}/{best_offer + 1}/',
-                    return_error=True
+                    return_error=True,
+                    priority=PRIORITY_ORDER
                 )
                 if 'error' in response:
                     log(
-                        f'Order for item with classid {item["i_classid"]} '
-                        f'and inctanceid {item["i_instanceid"]} '
-                        f'can not be changed now!',
-                        'ERROR'
+                        'Order for item with classid %s and inctanceid %s can not be changed now!',
+                        'ERROR', item['i_classid'], item['i_instanceid']
                     )
                     continue
                 else:
+                    best_buy_offer_cache.invalidate(
+                        f'{item["i_classid"]}_{item["i_instanceid"]}'
+                    )
+                    invalidate_order_book(bot)
                     await ItemGroup.objects.filter(
                         market_hash_name=item['i_market_hash_name'],
                         min_sell_price__lt=best_offer + 1
@@ -403,50 +684,46 @@ async def update_bots_orders(bot):
 
 async def update_selling_items(bot: Bot):
 
-    groups = {}
-
-    async def get_group_by_hash(_hash: str) -> ItemGroup:
-        if _hash in groups:
-            return groups[_hash]
-        else:
-            _group = await ItemGroup.objects.get(market_hash_name=_hash)
-            groups[_hash] = _group
-            return _group
-
     items_on_sale = await send_request_to_market(
         bot,
-        'https://market.csgo.com/api/v2/items',
+        f'{market_url}/api/v2/items',
         error_recursion=True,
         return_error=True
     )
-    if not items_on_sale['items'] or 'error' in items_on_sale:
-        log(f'No items in active of this group!')
+    if 'error' in items_on_sale or not items_on_sale.get('items'):
+        if 'error' not in items_on_sale:
+            market_listed_items.set(0, bot=bot.id)
+        log('No items in active of this group!')
         return
+    market_listed_items.set(len(items_on_sale['items']), bot=bot.id)
+
+    # все группы выставленных предметов загружаются одним запросом
+    groups = await get_groups_by_hash_names(
+        [item['market_hash_name'] for item in items_on_sale['items']],
+        bot
+    )
 
     for item in items_on_sale['items']:
-        group = await get_group_by_hash(item['market_hash_name'])
+        group = groups.get(item['market_hash_name'])
+        if group is None:
+            continue
         if item['status'] == '1' and int(group.min_sell_price * 1.1) < item['price'] * 100:
 
-            items = await send_request_to_market(
-                bot,
-                'https://market.csgo.com/api/v2/search-item-by-hash-name',
-                {
-                    'hash_name': item['market_hash_name']
-                }
-            )
+            items = await search_item_by_hash_name(bot, item['market_hash_name'])
 
             for _item in items['data']:
                 if item['price'] * 100 > _item['price'] > int(group.min_sell_price * 1.1):
                     response = await send_request_to_market(
                         bot,
-                        'https://market.csgo.com/api/v2/set-price',
+                        f'{market_url}/api/v2/set-price',
                         {
                             'item_id': item['item_id'],
                             'price': _item['price'] - 1,
                             'cur': 'RUB'
                         },
                         error_recursion=True,
-                        return_error=True
+                        return_error=True,
+                        priority=PRIORITY_ORDER
                     )
                     if 'error' in response:
                         log(response['error'])
@@ -459,75 +736,91 @@ async def delete_orders(bot: Bot, group: ItemGroup):
     """
     if group.to_order_amount < group.amount:
         log(
-            f'In deleting all orders for group'
-            f' with market_hash_name {group.market_hash_name}:'
+            'In deleting all orders for group with market_hash_name %s:', 'INFO',
+            group.market_hash_name
         )
 
-        items = await send_request_to_market(
-            bot,
-            'https://market.csgo.com/api/GetOrders//',
-            error_recursion=True,
-            return_error=True
-        )
-        if 'error' in items or items['Orders'] == "No orders":
-            log(items.get('error', items.get('Orders')))
-            return
-        else:
-            for item in items['Orders']:
-                if item['i_market_hash_name'] == group.market_hash_name:
+        deleted = 0
+        fetched = False
+        while True:
+            order_book = await get_order_book(bot)
+            if not order_book:
+                log('No orders')
+                if not fetched:
+                    # ордеры не получены, min_sell_price группы остаётся прежним
+                    return
+                # уже отменённые ордеры всё равно возвращаются в to_order_amount
+                break
+            fetched = True
 
-                    response = await send_request_to_market(
-                        bot,
-                        f'https://market.csgo.com/api/ProcessOrder/'
-                        f'{item["i_classid"]}/{item["i_instanceid"]}/0/',
-                        return_error=True,
-                        error_recursion=True
-                    )
-                    if 'error' in response:
-                        log(response['error'], 'ERROR')
-                        if response['error'] == 'same_price':
-                            continue
-                        elif response['error'] == 'internal':
-                            await asyncio.sleep(20)
-                            await delete_orders(bot, group)
-
-                    else:
-                        group.to_order_amount += 1
-
-        await group.update(
-            to_order_amount=group.to_order_amount,
-            min_sell_price=0
-        )
+            internal_error = False
+            processed = 0
+            for item in order_book.for_hash_name(group.market_hash_name):
+
+                response = await send_request_to_market(
+                    bot,
+                    f'{market_url}/api/ProcessOrder/'
+                    f'{item["i_classid"]}/{item["i_instanceid"]}/0/',
+                    return_error=True,
+                    error_recursion=True,
+                    priority=PRIORITY_ORDER
+                )
+                if 'error' in response:
+                    log(response['error'], 'ERROR')
+                    if response['error'] == 'same_price':
+                        continue
+                    elif response['error'] == 'internal':
+                        internal_error = True
+                        break
+
+                else:
+                    processed += 1
+
+            if processed or internal_error:
+                invalidate_order_book(bot)
+            deleted += processed
+
+            # при внутренней ошибке маркета список ордеров запрашивается заново
+            if not internal_error:
+                break
+            await asyncio.sleep(20)
+
+        await group.add_to_order_amount(deleted, min_sell_price=0)
 
 
 async def delete_sale_offers(bot: Bot, group: ItemGroup):
     """
     Удаляет все продложения, выставленные данной группой.
     """
-    items = await send_request_to_market(
-        bot,
-        'https://market.csgo.com/api/v2/items',
-        return_error=True,
-        error_recursion=True
-    )
-    if not items['items'] or 'error' in items:
-        log(f'No items in active of this group!')
-        return
+    for attempt in range(request_retries):
+        items = await send_request_to_market(
+            bot,
+            f'{market_url}/api/v2/items',
+            return_error=True,
+            error_recursion=True
+        )
+        if not items['items'] or 'error' in items:
+            log('No items in active of this group!')
+            return
 
-    left_items = False
-    for item in items['items']:
-        if item['status'] == '1' and item['market_hash_name']:
-            response = await send_request_to_market(
-                bot,
-                'https://market.csgo.com/api/v2/set-price',
-                {
-                    'item_id': item['item_id'],
-                    'price': 0,
-                    'cur': 'RUB'
-                }
-            )
-            if 'error' in response:
-                log(response['error'], 'ERROR')
-                left_items = True
-    if left_items:
-        await delete_sale_offers(bot, group)
+        left_items = False
+        for item in items['items']:
+            if item['status'] == '1' and item['market_hash_name']:
+                response = await send_request_to_market(
+                    bot,
+                    f'{market_url}/api/v2/set-price',
+                    {
+                        'item_id': item['item_id'],
+                        'price': 0,
+                        'cur': 'RUB'
+                    },
+                    priority=PRIORITY_ORDER
+                )
+                if 'error' in response:
+                    log(response['error'], 'ERROR')
+                    left_items = True
+        if not left_items:
+            return
+        await asyncio.sleep(10)
+
+    log('Not all sale offers of bot %s were removed', 'ERROR', bot.id)
@@ -0,0 +1,108 @@
+import os
+import json
+import asyncio
+from typing import Awaitable, Callable
+
+import aiohttp
+
+from .models import Bot
+from .utils import send_request_to_market, market_url
+from logs.logger import log
+
+# push-режим: фоновые задачи просыпаются по событиям маркета, а опрос становится редкой сверкой
+push_mode = os.environ.get('MARKET_WEBSOCKET', '0') == '1'
+ws_url = os.environ.get('MARKET_WS_URL', 'wss://wsn.dota2.net/wsn/')
+# публичные каналы, на которые дополнительно подписывается каждое соединение
+ws_channels = [
+    channel for channel in os.environ.get('MARKET_WS_CHANNELS', '').split(',') if channel
+]
+ws_ping_interval = 40
+
+# какие задачи бота будить при событии маркета
+event_targets = {
+    # наш выставленный предмет купили, нужно передать его
+    'itemstatus_go': ('give_items', 'update_sell_price'),
+    # сработал ордер, к нам едет трейд
+    'itemout_new_go': ('take_items', 'update_orders_price'),
+    'additem_go': ('update_sell_price',),
+    # изменение цен
+    'history_go': ('update_orders_price',),
+}
+
+
+def poll_interval(polling: float, sweep: float) -> float:
+    """В push-режиме опрос нужен только для сверки состояния."""
+    return sweep if push_mode else polling
+
+
+class MarketWebsocket:
+    """
+    Подписка на личные события бота.
+    При событии вызывается on_event(<имя задачи>) для каждой задачи из event_targets.
+    url и auth_token можно подменить, чтобы работать с локальным сервером.
+    """
+
+    def __init__(
+            self,
+            bot: Bot,
+            on_event: Callable[[str], None],
+            url: str = ws_url,
+            auth_token: Callable[[], Awaitable[str]] = None,
+            channels: list = None
+    ):
+        self.bot = bot
+        self.on_event = on_event
+        self.url = url
+        self.channels = ws_channels if channels is None else channels
+        self._auth_token = auth_token or self.market_auth_token
+
+    async def market_auth_token(self) -> str:
+        response = await send_request_to_market(
+            self.bot,
+            f'{market_url}/api/v2/get-ws-auth',
+            error_recursion=True,
+            return_error=True
+        )
+        return response['wsAuth']
+
+    def dispatch(self, message: dict):
+        for name in event_targets.get(message.get('type'), ()):
+            self.on_event(name)
+
+    async def _ping(self, ws: aiohttp.ClientWebSocketResponse):
+        while True:
+            await asyncio.sleep(ws_ping_interval)
+            await ws.send_str('ping')
+
+    async def listen(self, session: aiohttp.ClientSession):
+        async with session.ws_connect(self.url) as ws:
+            await ws.send_str(await self._auth_token())
+            for channel in self.channels:
+                await ws.send_str(channel)
+
+            ping = asyncio.create_task(self._ping(ws))
+            try:
+                async for message in ws:
+                    if message.type != aiohttp.WSMsgType.TEXT or message.data == 'pong':
+                        continue
+                    try:
+                        self.dispatch(json.loads(message.data))
+                    except (ValueError, AttributeError):
+                        log('Unknown websocket message: %s', 'WARNING', message.data)
+            finally:
+                ping.cancel()
+
+    async def run(self):
+        """Держит соединение открытым, переподключаясь с нарастающей паузой."""
+        delay = 1
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    await self.listen(session)
+                    delay = 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log('Websocket of bot %s: %s', 'ERROR', self.bot.id, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
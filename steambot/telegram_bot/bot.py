@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from telegram.ext import Updater
+from telegram.ext import ApplicationBuilder
 
 from telegram_bot.command_handlers import (
     start_handler, help_handler, market_bot_inventory_handler,
@@ -8,28 +8,36 @@ from telegram_bot.command_handlers import (
     list_bot_handler, create_bot_handler, set_bot_status_handler,
     update_bot_market_secret_handler, list_item_group_handler,
     create_item_group_handler, set_item_group_state_handler,
+    import_item_groups_handler, export_item_groups_handler, next_page_handler,
 )
 
 load_dotenv()
 
 bot_name = os.environ.get('BOT_NAME')
 
-updater = Updater(token=os.environ.get('TELEGRAM_TOKEN'), use_context=True)
-dispatcher = updater.dispatcher
+# команды обрабатываются в event loop фоновых задач, каждая в своей задаче,
+# поэтому медленная команда не задерживает остальные
+application = ApplicationBuilder().token(
+    os.environ.get('TELEGRAM_TOKEN')
+).concurrent_updates(True).build()
 
-dispatcher.add_handler(start_handler)
-dispatcher.add_handler(help_handler)
-dispatcher.add_handler(market_bot_inventory_handler)
+application.add_handler(start_handler)
+application.add_handler(help_handler)
+application.add_handler(market_bot_inventory_handler)
 
-dispatcher.add_handler(list_user_handler)
-dispatcher.add_handler(add_user_handler)
-dispatcher.add_handler(delete_user_handler)
+application.add_handler(list_user_handler)
+application.add_handler(add_user_handler)
+application.add_handler(delete_user_handler)
 
-dispatcher.add_handler(list_bot_handler)
-dispatcher.add_handler(create_bot_handler)
-dispatcher.add_handler(set_bot_status_handler)
-dispatcher.add_handler(update_bot_market_secret_handler)
+application.add_handler(list_bot_handler)
+application.add_handler(create_bot_handler)
+application.add_handler(set_bot_status_handler)
+application.add_handler(update_bot_market_secret_handler)
 
-dispatcher.add_handler(list_item_group_handler)
-dispatcher.add_handler(create_item_group_handler)
-dispatcher.add_handler(set_item_group_state_handler)
+application.add_handler(list_item_group_handler)
+application.add_handler(create_item_group_handler)
+application.add_handler(set_item_group_state_handler)
+application.add_handler(import_item_groups_handler)
+application.add_handler(export_item_groups_handler)
+
+application.add_handler(next_page_handler)
@@ -1,19 +1,68 @@
 import os
+import io
+import csv
+import bisect
 import pathlib
 import json
-import asyncio
+import tempfile
 from dotenv import load_dotenv
 from functools import wraps
+from typing import Optional
 
-from telegram.ext import CommandHandler
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters
 
-from market.models import Bot, ItemGroup, User
-from market.utils import send_request_to_market, delete_orders
+from core.database import database
+from market.cache import TTLCache
+from market.models import Bot, ItemGroup, User, get_groups_by_hash_names
+from market.utils import send_request_to_market, delete_orders, fetch_average_prices, market_url
+from market.actors import send_bot_state
 
 load_dotenv()
 
 bot_name = os.environ.get('BOT_NAME')
 basedir = pathlib.Path(__file__).parent.parent.absolute()
+superuser_id = int(os.environ.get('SUPERUSER', 0))
+# как часто перечитывать пользователей из базы (секунды), 0 - только при первой команде
+allowed_users_refresh = int(os.environ.get('ALLOWED_USERS_REFRESH', 300))
+# строк на одной странице list_bot, list_item_group и market_bot_inventory
+page_size = int(os.environ.get('TELEGRAM_PAGE_SIZE', 20))
+# предел длины сообщения telegram
+message_limit = 4096
+
+# наибольшее число строк в файле /import_item_groups
+import_limit = int(os.environ.get('IMPORT_LIMIT', 5000))
+# состояния, с которыми группа может быть загружена из файла;
+# группы в состоянии delete удаляются и не выгружаются
+import_states = ('active', 'disabled', 'sell', 'buy', 'hold')
+# колонки файла /export_item_groups, его можно снова загрузить через /import_item_groups
+export_fields = ('id', 'market_hash_name', 'state', 'amount', 'to_order_amount', 'min_sell_price')
+
+# инвентарь с маркета, загруженный командой market_bot_inventory, на время листания страниц
+inventory_snapshots = TTLCache(
+    ttl=int(os.environ.get('INVENTORY_SNAPSHOT_TTL', 300)), maxsize=64, name='my-inventory'
+)
+
+# telegram id пользователей, которым разрешено управлять ботом, None - ещё не загружены
+allowed_users: Optional[set] = None
+
+
+async def load_allowed_users() -> set:
+    """
+    Перечитывает пользователей из базы.
+    add_user и delete_user меняют множество сами, перечитывание нужно только
+    для изменений, сделанных в обход бота.
+    """
+    global allowed_users
+    users = await User.objects.values_list('id', flatten=True)
+    allowed_users = {superuser_id, *users}
+    return allowed_users
+
+
+async def get_allowed_users() -> set:
+    if allowed_users is None:
+        return await load_allowed_users()
+    return allowed_users
 
 
 def restriction(handler_function):
@@ -21,22 +70,13 @@ def restriction(handler_function):
     Проверяет, находится ли пользователь в списке дозволенных к обслуживанию.
     """
 
-    async def _allowed_users() -> list:
-        """
-        Так как пользователей не много, то можно проходить по всем.
-        """
-        allowed_users = [int(os.environ.get('SUPERUSER'))]
-        users = list(await User.objects.values_list('id', flatten=True))
-        allowed_users.extend(users)
-        return allowed_users
-
     @wraps(handler_function)
-    def wrapper(update, context):
+    async def wrapper(update, context):
         user_id = update.effective_user.id
-        if user_id in asyncio.run(_allowed_users()):
-            handler_function(update, context)
+        if user_id in await get_allowed_users():
+            await handler_function(update, context)
         else:
-            context.bot.send_message(
+            await context.bot.send_message(
                 chat_id=update.effective_chat.id,
                 text='Access denied!'
             )
@@ -45,7 +85,7 @@ def restriction(handler_function):
     return wrapper
 
 
-def check_args(context, update, arguments: dict):
+async def check_args(context, update, arguments: dict):
     try:
         for arg in context.args:
             key_value = arg.partition('=')
@@ -61,15 +101,237 @@ def check_args(context, update, arguments: dict):
 
         return arguments
     except AssertionError:
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text='Wrong arguments passed!'
         )
         return None
 
 
+def split_page(rows: list) -> tuple:
+    """
+    Страница запрашивается с одной лишней строкой: по ней видно, есть ли следующая.
+    Строки, не поместившиеся в сообщение telegram, переносятся на следующую страницу.
+    Возвращает строки страницы и признак следующей страницы.
+    """
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    length = 0
+    for i, (_, text) in enumerate(rows):
+        length += len(text)
+        if length > message_limit and i:
+            return rows[:i], True
+    return rows, has_next
+
+
+async def send_page(update, context, title: str, rows: list, next_data: str, empty_text: str):
+    """
+    Отправляет страницу списка с кнопкой следующей страницы.
+    rows - пары (ключ строки, текст), next_data - callback_data кнопки без ключа,
+    empty_text - текст для пустой страницы.
+    При нажатии кнопки сообщение заменяется следующей страницей.
+    """
+    rows, has_next = split_page(rows)
+    if rows:
+        text = (title + ''.join(row for _, row in rows))[:message_limit]
+    else:
+        text = empty_text
+    markup = None
+    if has_next:
+        markup = InlineKeyboardMarkup([[
+            InlineKeyboardButton('Далее', callback_data=f'{next_data}:{rows[-1][0]}')
+        ]])
+
+    query = update.callback_query
+    if query is not None:
+        await query.answer()
+        await query.edit_message_text(text=text, reply_markup=markup)
+    else:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=text,
+            reply_markup=markup
+        )
+
+
+async def show_bots(update, context, after: int = 0):
+    """Страница ботов с id больше after."""
+    bots = await Bot.objects.filter(id__gt=after).order_by('id').limit(page_size + 1).all()
+    await send_page(
+        update, context, 'Все боты:\n\n',
+        [(bot.id, str(bot) + '\n\n') for bot in bots],
+        'list_bot:', 'Ботов нет.'
+    )
+
+
+async def show_item_groups(update, context, after: int = 0):
+    """Страница групп предметов с id больше after."""
+    item_groups = await ItemGroup.objects.filter(
+        id__gt=after
+    ).order_by('id').limit(page_size + 1).all()
+    await send_page(
+        update, context, 'Все группы предметов:\n\n',
+        [(item_group.id, str(item_group) + '\n\n') for item_group in item_groups],
+        'list_item_group:', 'Групп предметов нет.'
+    )
+
+
+async def get_inventory(bot: Bot) -> tuple:
+    """
+    Инвентарь бота с маркета, отсортированный по id предмета: (id предметов, предметы).
+    Запрашивается один раз на время листания, страницы вырезаются из сохранённого ответа.
+    """
+
+    async def load() -> tuple:
+        # запрос к маркету идёт через общую сессию бота и не задерживает другие команды
+        response = await send_request_to_market(
+            bot,
+            f'{market_url}/api/v2/my-inventory/'
+        )
+        items = sorted(response.get('items') or [], key=lambda item: inventory_key(item['id']))
+        return [inventory_key(item['id']) for item in items], items
+
+    return await inventory_snapshots.get_or_load(bot.id, load)
+
+
+def inventory_key(item_id) -> tuple:
+    """id предметов - строки из цифр, такой ключ сортирует их как числа."""
+    item_id = str(item_id)
+    return len(item_id), item_id
+
+
+async def show_inventory(update, context, bot: Bot, after: str = ''):
+    """Страница инвентаря с id предметов больше after."""
+    ids, items = await get_inventory(bot)
+    start = bisect.bisect_right(ids, inventory_key(after)) if after else 0
+    page = items[start:start + page_size + 1]
+    await send_page(
+        update, context, f'Инвентарь бота {bot.id} ({len(items)}):\n\n',
+        [
+            (
+                item['id'],
+                f"{item.get('market_hash_name')} - id {item['id']}, "
+                f"{item.get('market_price')}\n"
+            ) for item in page
+        ],
+        f'market_bot_inventory:{bot.id}', 'Предметов для продажи нет.'
+    )
+
+
 @restriction
-def help(update, context):
+async def next_page(update, context):
+    """
+    Кнопка "Далее" под списками.
+    callback_data: <команда>:[<id бота>]:<ключ последней показанной строки>.
+    """
+
+    command, arg, after = update.callback_query.data.split(':', 2)
+    if command == 'list_bot':
+        await show_bots(update, context, int(after))
+    elif command == 'list_item_group':
+        await show_item_groups(update, context, int(after))
+    elif command == 'market_bot_inventory':
+        bot = await Bot.objects.get_or_none(id=int(arg))
+        if not bot:
+            await update.callback_query.answer('Bot with this "id" does not exists!')
+            return
+        await show_inventory(update, context, bot, after)
+
+
+def parse_integer(value, default: int) -> int:
+    """
+    Неотрицательное целое из ячейки файла: число JSON или строка из цифр.
+    Дробные числа и true/false не принимаются.
+    """
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    value = int(value)
+    if value < 0:
+        raise ValueError(value)
+    return value
+
+
+def parse_item_groups(file_name: str, data: bytes) -> tuple:
+    """
+    Строки файла импорта: JSON-список объектов или CSV с заголовком.
+    Возвращает проверенные строки и список ошибок.
+    """
+    text = data.decode('utf-8-sig')
+    if file_name.lower().endswith('.json'):
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError('JSON must be a list of objects')
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+    if len(rows) > import_limit:
+        return [], [f'Too many rows: {len(rows)}, limit is {import_limit}']
+
+    result, errors, names = [], [], set()
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            errors.append(f'{number}: row must be an object')
+            continue
+        name = str(row.get('market_hash_name') or '').strip()
+        state = str(row.get('state') or 'active').strip()
+        try:
+            amount = parse_integer(row.get('amount'), 1)
+            min_sell_price = parse_integer(row.get('min_sell_price'), 0)
+        except ValueError:
+            errors.append(f'{number}: amount and min_sell_price must be non-negative integers')
+            continue
+        if not name:
+            errors.append(f'{number}: market_hash_name is empty')
+        elif name in names:
+            errors.append(f'{number}: {name} is repeated')
+        elif state not in import_states:
+            errors.append(f'{number}: wrong state {state}')
+        else:
+            names.add(name)
+            result.append({
+                'market_hash_name': name,
+                'state': state,
+                'amount': amount,
+                'min_sell_price': min_sell_price,
+            })
+    return result, errors
+
+
+async def write_item_groups(file, bot: Bot, file_format: str) -> int:
+    """
+    Записывает группы бота в file по мере чтения из базы, не загружая их все в память.
+    Возвращает число записанных групп.
+    """
+    text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    if file_format == 'json':
+        text.write('[')
+    else:
+        writer.writerow(export_fields)
+
+    count = 0
+    groups = ItemGroup.objects.filter(bot=bot.id, state__in=import_states).order_by('id')
+    async for group in groups.iterate():
+        values = [group.pk if field == 'id' else getattr(group, field) for field in export_fields]
+        if file_format == 'json':
+            text.write((',\n' if count else '\n') + json.dumps(
+                dict(zip(export_fields, values)), ensure_ascii=False
+            ))
+        else:
+            writer.writerow(values)
+        count += 1
+
+    if file_format == 'json':
+        text.write('\n]\n')
+    text.flush()
+    text.detach()
+    return count
+
+
+@restriction
+async def help(update, context):
     """
 /help
     Документация бота.
@@ -93,31 +355,33 @@ def help(update, context):
     result += list_item_group.__doc__
     result += create_item_group.__doc__
     result += set_item_group_state_amount.__doc__
+    result += import_item_groups.__doc__
+    result += export_item_groups.__doc__
 
-    context.bot.send_message(
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=result
     )
 
 
 @restriction
-def start(update, context):
+async def start(update, context):
     """
 /start
     Бот работает лишь с заранее добавленными пользователями.
     """
-    context.bot.send_message(
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text="I am trade bot working with market.csgo!"
     )
 
 
 @restriction
-def market_bot_inventory(update, context):
+async def market_bot_inventory(update, context):
     """
 /market_bot_inventory
     Инвентарь, полученный с маркета
-    (отображаются предметы, доступные для продажи).
+    (отображаются предметы, доступные для продажи), постранично.
     Аргументы:
         <id> - id бота.
     """
@@ -130,39 +394,34 @@ def market_bot_inventory(update, context):
     arguments = {
         'id': '--'
     }
-    arguments = check_args(context, update, arguments)
+    arguments = await check_args(context, update, arguments)
     if not arguments:
         return
 
     try:
-        bot = asyncio.run(get_bot(**arguments))
+        bot = await get_bot(**arguments)
     except AssertionError:
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text='Bot with this "id" does not exists!'
         )
         return
 
-    response = asyncio.run(send_request_to_market(
-        bot,
-        'https://market.csgo.com/api/v2/my-inventory/'
-    ))
-    context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=response.get('items')
-    )
+    # новая команда показывает свежий инвентарь, кнопка "Далее" - сохранённый
+    inventory_snapshots.invalidate(bot.id)
+    await show_inventory(update, context, bot)
 
 
 @restriction
-def list_user(update, context):
+async def list_user(update, context):
     """
 /list_user
     Список пользователей бота.
     """
-    users = asyncio.run(User.objects.all())
+    users = await User.objects.all()
 
     if len(users) <= 1:
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text='You are the only user except superuser!'
         )
@@ -172,14 +431,14 @@ def list_user(update, context):
     for user in users:
         result += str(user) + '\n\n'
 
-    context.bot.send_message(
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=result
     )
 
 
 @restriction
-def add_user(update, context):
+async def add_user(update, context):
     """
 /add_user
     Добавляет пользователя к обслуживаемым ботом.
@@ -190,27 +449,28 @@ def add_user(update, context):
     async def add_user_in_db(id: int) -> User:
         return await User.objects.get_or_create(id=id)
 
-    if update.effective_user.id == int(os.environ.get('SUPERUSER')):
+    if update.effective_user.id == superuser_id:
         arguments = {
             'id': '--'
         }
-        arguments = check_args(context, update, arguments)
+        arguments = await check_args(context, update, arguments)
         if not arguments:
             return
-        user = asyncio.run(add_user_in_db(**arguments))
-        context.bot.send_message(
+        user = await add_user_in_db(**arguments)
+        (await get_allowed_users()).add(int(arguments['id']))
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text=str(user)
         )
     else:
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="You are not allowed to add users!"
         )
 
 
 @restriction
-def delete_user(update, context):
+async def delete_user(update, context):
     """
 /delete_user
     Удалить пользователя.
@@ -218,53 +478,39 @@ def delete_user(update, context):
     Принимает один аргумент <id> - telegram id удаляемого пользователя.
     """
 
-    if update.effective_user.id == int(os.environ.get('SUPERUSER')):
+    if update.effective_user.id == superuser_id:
         arguments = {
             'id': '--'
         }
-        arguments = check_args(context, update, arguments)
+        arguments = await check_args(context, update, arguments)
         if not arguments:
             return
-        asyncio.run(User.objects.delete(**arguments))
-        context.bot.send_message(
+        await User.objects.delete(**arguments)
+        if int(arguments['id']) != superuser_id:
+            (await get_allowed_users()).discard(int(arguments['id']))
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text='User deleted!'
         )
     else:
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="You are not allowed to delete users!"
         )
 
 
 @restriction
-def list_bot(update, context):
+async def list_bot(update, context):
     """
 /list_bot
-    Список всех ботов.
+    Список всех ботов, постранично.
     """
 
-    bots = asyncio.run(Bot.objects.all())
-
-    if not bots:
-        context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text='Ботов нет.'
-        )
-        return
-
-    result = 'Все боты:\n\n'
-    for bot in bots:
-        result += str(bot) + '\n\n'
-
-    context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=result
-    )
+    await show_bots(update, context)
 
 
 @restriction
-def create_bot(update, context):
+async def create_bot(update, context):
     """
 /create_bot
     Создание бота, имитирующего клиента steam.
@@ -308,11 +554,11 @@ def create_bot(update, context):
         'identity_secret': '--',
         'description': 'Some csgo.market bot.'
     }
-    arguments = check_args(context, update, arguments)
+    arguments = await check_args(context, update, arguments)
     if not arguments:
         return
 
-    bot = asyncio.run(create_bot_in_db(
+    bot = await create_bot_in_db(
         secret_key=arguments['secret_key'],
         api_key=arguments['api_key'],
         username=arguments['username'],
@@ -320,7 +566,7 @@ def create_bot(update, context):
         steamguard_file=f'{basedir}/steam_guards/'
                         f'steam_guard_{arguments["steamid"]}.json',
         description=arguments['description']
-    ))
+    )
 
     data = {
         "steamid": arguments['steamid'],
@@ -330,14 +576,14 @@ def create_bot(update, context):
     with open(bot.steamguard_file, "w", encoding="utf-8") as file:
         json.dump(data, file)
 
-    context.bot.send_message(
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=str(bot)
     )
 
 
 @restriction
-def set_bot_status(update, context):
+async def set_bot_status(update, context):
     """
 /set_bot_status
     Установко боту нового статуса.
@@ -364,27 +610,30 @@ def set_bot_status(update, context):
         'state': '--'
     }
 
-    arguments = check_args(context, update, arguments)
+    arguments = await check_args(context, update, arguments)
     if not arguments:
         return
 
     try:
-        bot = asyncio.run(change_bot_state_in_db(**arguments))
+        bot = await change_bot_state_in_db(**arguments)
     except AssertionError:
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text='Bot with this "id" does not exists!'
         )
         return
 
-    context.bot.send_message(
+    # актор бота применит статус сразу, не дожидаясь сверки с базой
+    send_bot_state(bot.id, bot.state)
+
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=str(bot)
     )
 
 
 @restriction
-def update_bot_market_secret(update, context):
+async def update_bot_market_secret(update, context):
     """
 /update_bot_market_secret
     Обновление скеретного ключа от API маркета.
@@ -406,45 +655,30 @@ def update_bot_market_secret(update, context):
         'id': '--',
         'state': '--'
     }
-    arguments = check_args(context, update, arguments)
+    arguments = await check_args(context, update, arguments)
     if not arguments:
         return
 
-    bot = asyncio.run(update_secret(**arguments))
+    bot = await update_secret(**arguments)
 
-    context.bot.send_message(
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=str(bot)
     )
 
 
 @restriction
-def list_item_group(update, context):
+async def list_item_group(update, context):
     """
 /list_item_group
-    Список групп предметов.
+    Список групп предметов, постранично.
     """
-    item_groups = asyncio.run(ItemGroup.objects.all())
 
-    if not item_groups:
-        context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text='Групп предметов нет.'
-        )
-        return
-
-    result = 'Все группы предметов:\n\n'
-    for item_group in item_groups:
-        result += str(item_group) + '\n\n'
-
-    context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=result
-    )
+    await show_item_groups(update, context)
 
 
 @restriction
-def create_item_group(update, context):
+async def create_item_group(update, context):
     """
 /create_item_group
     Создание группы предметов.
@@ -478,20 +712,20 @@ def create_item_group(update, context):
         'market_hash_name': None,
         'amount': 1
     }
-    arguments = check_args(context, update, arguments)
+    arguments = await check_args(context, update, arguments)
     if not arguments:
         return
 
-    group = asyncio.run(create_item_group_in_db(**arguments))
+    group = await create_item_group_in_db(**arguments)
 
-    context.bot.send_message(
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=str(group)
     )
 
 
 @restriction
-def set_item_group_state_amount(update, context):
+async def set_item_group_state_amount(update, context):
     """
 /set_item_group_state_amount
     Установка группе предметов нового статуса или изменение количества предметов для заказа.
@@ -564,27 +798,135 @@ def set_item_group_state_amount(update, context):
         'state': None,
         'amount': None
     }
-    arguments = check_args(context, update, arguments)
+    arguments = await check_args(context, update, arguments)
     if not arguments:
         return
 
     try:
-        group = asyncio.run(
-            set_item_group_state_in_db(**arguments)
-        )
+        group = await set_item_group_state_in_db(**arguments)
     except AssertionError:
-        context.bot.send_message(
+        await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text='Item group with this "id" does not exists!'
         )
         return
 
-    context.bot.send_message(
+    await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=str(group)
     )
 
 
+@restriction
+async def import_item_groups(update, context):
+    """
+/import_item_groups
+    Создание групп предметов из файла.
+    Файл отправляется документом с подписью "/import_item_groups bot=<id>".
+    Файл - CSV с заголовком или JSON-список объектов с полями:
+        market_hash_name - хэш-название предмета с маркета,
+        amount - количество предметов в обороте (1 по умолчанию),
+        min_sell_price - минимальная цена продажи (0 по умолчанию),
+        state - состояние: active (по умолчанию), disabled, sell, buy или hold.
+    Названия проверяются на маркете, группы создаются все вместе или ни одной.
+    """
+
+    # аргументы команды передаются в подписи к документу
+    context.args = (update.message.caption or '').split()[1:]
+    arguments = {
+        'bot': '--'
+    }
+    arguments = await check_args(context, update, arguments)
+    if not arguments:
+        return
+
+    bot = await Bot.objects.get_or_none(id=arguments['bot'])
+    if not bot:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text='Bot with this "id" does not exists!'
+        )
+        return
+
+    document = update.message.document
+    data = await (await document.get_file()).download_as_bytearray()
+    try:
+        rows, errors = parse_item_groups(document.file_name or '', bytes(data))
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f'Can not read file: {e}'
+        )
+        return
+
+    if not errors:
+        names = [row['market_hash_name'] for row in rows]
+        # market_hash_name уникален среди групп всех ботов
+        existing = await get_groups_by_hash_names(names)
+        prices = await fetch_average_prices(bot, names)
+        for name in names:
+            if name in existing:
+                errors.append(f'{name}: item group already exists')
+            elif name not in prices:
+                errors.append(f'{name}: not found on market')
+
+    if errors:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=('Nothing imported:\n' + '\n'.join(errors))[:message_limit]
+        )
+        return
+
+    async with database.transaction():
+        await ItemGroup.objects.bulk_create([
+            ItemGroup(bot=bot, to_order_amount=row['amount'], **row) for row in rows
+        ])
+
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=f'Imported {len(rows)} item groups.'
+    )
+
+
+@restriction
+async def export_item_groups(update, context):
+    """
+/export_item_groups
+    Выгрузка групп предметов бота файлом, который можно снова загрузить через /import_item_groups.
+    Группы в состоянии delete не выгружаются.
+    Аргументы:
+        <bot> - id бота,
+        <format> - csv (по умолчанию) или json.
+    """
+
+    arguments = {
+        'bot': '--',
+        'format': 'csv'
+    }
+    arguments = await check_args(context, update, arguments)
+    if not arguments:
+        return
+
+    bot = await Bot.objects.get_or_none(id=arguments['bot'])
+    if not bot or arguments['format'] not in ('csv', 'json'):
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text='Wrong arguments passed!'
+        )
+        return
+
+    # большой файл пишется на диск, а не держится в памяти;
+    # SpooledTemporaryFile до Python 3.11 нельзя обернуть в TextIOWrapper
+    with tempfile.TemporaryFile() as file:
+        await write_item_groups(file, bot, arguments['format'])
+        file.seek(0)
+        await context.bot.send_document(
+            chat_id=update.effective_chat.id,
+            document=file,
+            filename=f'item_groups_bot_{bot.id}.{arguments["format"]}'
+        )
+
+
 start_handler = CommandHandler('start', start)
 help_handler = CommandHandler('help', help)
 market_bot_inventory_handler = CommandHandler(
@@ -620,3 +962,16 @@ set_item_group_state_handler = CommandHandler(
     set_item_group_state_amount
 )
 
+import_item_groups_handler = MessageHandler(
+    filters.Document.ALL & filters.CaptionRegex(r'^/import_item_groups'),
+    import_item_groups
+)
+export_item_groups_handler = CommandHandler(
+    'export_item_groups',
+    export_item_groups
+)
+
+next_page_handler = CallbackQueryHandler(
+    next_page,
+    pattern=r'^(list_bot|list_item_group|market_bot_inventory):'
+)
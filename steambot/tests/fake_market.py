@@ -0,0 +1,506 @@
+"""
+Локальная замена market.csgo для нагрузочных прогонов и отладки фоновых задач.
+Реализует методы API, которыми пользуется бот, хранит состояние каждого secret key в памяти
+и умеет добавлять задержку, случайные ошибки и ограничение частоты запросов.
+
+Запуск отдельным процессом из каталога steambot:
+    python -m tests.fake_market --port 8080 --latency 0.05 --error-rate 0.01 --rps 5
+после чего боту нужно задать MARKET_URL=http://127.0.0.1:8080,
+а для push-режима ещё MARKET_WEBSOCKET=1 и MARKET_WS_URL=ws://127.0.0.1:8080/ws/.
+"""
+import json
+import zlib
+import random
+import asyncio
+import argparse
+import itertools
+from collections import Counter, deque
+from time import monotonic
+from typing import Optional
+
+import requests
+from aiohttp import web, WSMsgType
+from steampy.client import TradeOfferState
+
+
+class Account:
+    """Состояние одного secret key. Все суммы в копейках."""
+
+    def __init__(self, money: int):
+        self.money = money
+        # (classid, instanceid) -> ордер в формате GetOrders
+        self.orders = {}
+        # id -> предмет в формате my-inventory
+        self.inventory = {}
+        # item_id -> предмет в формате items
+        self.on_sale = {}
+        # проданные предметы, которые нужно передать покупателю
+        self.sold = []
+        # предметы, купленные по ордерам, ждут принятия трейда в steam
+        self.incoming = []
+        # время последних запросов для ограничения частоты
+        self.requests = deque()
+        # открытые websocket-соединения аккаунта
+        self.sockets = []
+
+
+class FakeMarket:
+    """
+    latency и jitter - задержка ответа в секундах (latency + uniform(0, jitter)),
+    error_rate - доля запросов, на которые отвечается 500 {'error': 'internal'},
+    rps - сколько запросов в секунду разрешено одному ключу, сверх этого отвечается 429,
+    fill_rate и sell_rate - вероятность того, что за секунду сработает ордер
+    или купят выставленный предмет.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            rps: Optional[float] = None,
+            money: int = 1000000,
+            offers_per_item: int = 10,
+            fill_rate: float = 0.0,
+            sell_rate: float = 0.0,
+            seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rps = rps
+        self.money = money
+        self.offers_per_item = offers_per_item
+        self.fill_rate = fill_rate
+        self.sell_rate = sell_rate
+        self.random = random.Random(seed)
+
+        self.accounts = {}
+        self.names_by_class = {}
+        self.ids = itertools.count(1)
+
+        self.requests = Counter()
+        self.throttled = 0
+        self.errors = 0
+        self.started: Optional[float] = None
+
+        self.app = web.Application()
+        self.app.router.add_get('/api/{path:.*}', self.handle)
+        self.app.router.add_get('/ws/', self.handle_ws)
+        self.runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+        self.ws_url: Optional[str] = None
+        # токен из get-ws-auth -> аккаунт
+        self.ws_tokens = {}
+        self._ticker: Optional[asyncio.Task] = None
+
+        self.methods = {
+            'ping': self.ping,
+            'get-money': self.get_money,
+            'search-item-by-hash-name': self.search_item_by_hash_name,
+            'get-list-items-info': self.get_list_items_info,
+            'BestBuyOffer': self.best_buy_offer,
+            'InsertOrder': self.insert_order,
+            'UpdateOrder': self.update_order,
+            'ProcessOrder': self.process_order,
+            'GetOrders': self.get_orders,
+            'my-inventory': self.my_inventory,
+            'update-inventory': self.update_inventory,
+            'add-to-sale': self.add_to_sale,
+            'items': self.items,
+            'set-price': self.set_price,
+            'trade-request-give-p2p-all': self.trade_request_give_p2p_all,
+            'get-ws-auth': self.get_ws_auth,
+        }
+
+    def account(self, key: str) -> Account:
+        if key not in self.accounts:
+            self.accounts[key] = Account(self.money)
+        return self.accounts[key]
+
+    # каталог предметов строится из названия, поэтому подходит любое market_hash_name
+
+    def classid(self, hash_name: str) -> str:
+        classid = str(zlib.crc32(hash_name.encode()))
+        self.names_by_class[classid] = hash_name
+        return classid
+
+    @staticmethod
+    def base_price(hash_name: str) -> int:
+        return 1000 + zlib.crc32(hash_name.encode()) % 100000
+
+    def other_best_offer(self, classid: str, instanceid: str) -> Optional[int]:
+        """Лучший ордер других покупателей, у части предметов ордеров нет."""
+        if zlib.crc32(f'{classid}_{instanceid}'.encode()) % 4 == 0:
+            return None
+        return int(self.base_price(self.names_by_class.get(classid, classid)) * 0.5)
+
+    # сервер
+
+    async def handle(self, request: web.Request) -> web.Response:
+        parts = request.match_info['path'].split('/')
+        if parts and parts[0] == 'v2':
+            parts = parts[1:]
+        method, args = (parts[0] if parts else ''), parts[1:]
+        self.requests[method] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        key = request.query.get('key', '')
+        account = self.account(key)
+        if self.rps is not None:
+            now = monotonic()
+            while account.requests and now - account.requests[0] >= 1:
+                account.requests.popleft()
+            if len(account.requests) >= self.rps:
+                self.throttled += 1
+                return web.json_response({'error': 'Too many requests'}, status=429)
+            account.requests.append(now)
+
+        if method not in self.methods:
+            return web.json_response({'success': False, 'error': 'Bad method'}, status=404)
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({'success': False, 'error': 'internal'}, status=500)
+
+        return web.json_response(self.methods[method](account, request.query, args))
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        """
+        Websocket как у wsn.dota2.net: первое сообщение - токен из get-ws-auth,
+        следующие - названия публичных каналов, на ping отвечается pong.
+        """
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        account = None
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                if message.data == 'ping':
+                    await ws.send_str('pong')
+                elif account is None:
+                    account = self.ws_tokens.get(message.data)
+                    if account is None:
+                        await ws.close()
+                        break
+                    account.sockets.append(ws)
+        finally:
+            if account is not None:
+                account.sockets.remove(ws)
+        return ws
+
+    def push(self, account: Account, message: dict):
+        """Отправляет событие во все websocket-соединения аккаунта."""
+        data = json.dumps(message)
+        for ws in account.sockets:
+            asyncio.ensure_future(ws.send_str(data))
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Запускает сервер в текущем event loop и возвращает его адрес для MARKET_URL."""
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.url = f'http://{host}:{self.runner.addresses[0][1]}'
+        self.ws_url = f'ws://{host}:{self.runner.addresses[0][1]}/ws/'
+        self.started = monotonic()
+        if self.fill_rate or self.sell_rate:
+            self._ticker = asyncio.create_task(self._tick_loop())
+        return self.url
+
+    async def stop(self):
+        if self._ticker is not None:
+            self._ticker.cancel()
+        for account in self.accounts.values():
+            for ws in list(account.sockets):
+                await ws.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(1)
+            self.tick()
+
+    def tick(self):
+        """Срабатывание ордеров и покупка выставленных предметов."""
+        for account in self.accounts.values():
+            for class_instance, order in list(account.orders.items()):
+                if self.random.random() < self.fill_rate and account.money >= order['o_price']:
+                    del account.orders[class_instance]
+                    account.money -= order['o_price']
+                    account.incoming.append({
+                        'classid': order['i_classid'],
+                        'instanceid': order['i_instanceid'],
+                        'market_hash_name': order['i_market_hash_name'],
+                        'market_price': order['o_price'] / 100
+                    })
+                    self.push(account, {'type': 'itemout_new_go', 'data': order['i_market_hash_name']})
+            for item_id, item in list(account.on_sale.items()):
+                if self.random.random() < self.sell_rate:
+                    del account.on_sale[item_id]
+                    account.money += int(item['price'] * 100 * 0.95)
+                    account.sold.append(item)
+                    self.push(account, {'type': 'itemstatus_go', 'data': item_id})
+
+    def stats(self) -> dict:
+        total = sum(self.requests.values())
+        elapsed = monotonic() - self.started if self.started else 0
+        return {
+            'requests': total,
+            'requests_per_second': total / elapsed if elapsed else 0,
+            'throttled': self.throttled,
+            'errors': self.errors,
+            'by_method': dict(self.requests.most_common()),
+            'orders': sum(len(account.orders) for account in self.accounts.values()),
+            'on_sale': sum(len(account.on_sale) for account in self.accounts.values()),
+        }
+
+    # методы API
+
+    def ping(self, account: Account, query, args) -> dict:
+        return {'success': True, 'ping': 'pong'}
+
+    def get_money(self, account: Account, query, args) -> dict:
+        return {'success': True, 'money': account.money / 100, 'currency': 'RUB'}
+
+    def get_ws_auth(self, account: Account, query, args) -> dict:
+        token = f'ws{next(self.ids)}'
+        self.ws_tokens[token] = account
+        return {'success': True, 'wsAuth': token}
+
+    def search_item_by_hash_name(self, account: Account, query, args) -> dict:
+        hash_name = query.get('hash_name', '')
+        classid = self.classid(hash_name)
+        price = self.base_price(hash_name)
+        return {
+            'success': True,
+            'currency': 'RUB',
+            'data': [
+                {
+                    'market_hash_name': hash_name,
+                    'price': int(price * (1 + i / 100)),
+                    'class': classid,
+                    'instance': str(i),
+                    'count': 1
+                } for i in range(self.offers_per_item)
+            ]
+        }
+
+    def get_list_items_info(self, account: Account, query, args) -> dict:
+        data = {}
+        for hash_name in query.getall('list_hash_name[]', []):
+            self.classid(hash_name)
+            average = self.base_price(hash_name) / 100
+            data[hash_name] = {
+                'max': average * 1.2,
+                'min': average * 0.8,
+                'average': average,
+                'history': []
+            }
+        return {'success': True, 'currency': 'RUB', 'data': data}
+
+    def best_buy_offer(self, account: Account, query, args) -> dict:
+        classid, _, instanceid = args[0].partition('_') if args else ('', '', '')
+        offers = [
+            _account.orders[(classid, instanceid)]['o_price'] for _account in self.accounts.values()
+            if (classid, instanceid) in _account.orders
+        ]
+        other = self.other_best_offer(classid, instanceid)
+        if other is not None:
+            offers.append(other)
+        if not offers:
+            return {'success': False, 'error': 'There are no buy orders for this item'}
+        return {'success': True, 'best_offer': max(offers)}
+
+    def _order(self, classid: str, instanceid: str, price: int) -> dict:
+        return {
+            'i_classid': classid,
+            'i_instanceid': instanceid,
+            'i_market_hash_name': self.names_by_class.get(classid, classid),
+            'o_price': price,
+        }
+
+    def insert_order(self, account: Account, query, args) -> dict:
+        classid, instanceid, price = args[0], args[1], int(args[2])
+        if (classid, instanceid) in account.orders:
+            return {'success': False, 'error': 'same_order'}
+        if price > account.money:
+            return {'success': False, 'error': 'money'}
+        account.orders[(classid, instanceid)] = self._order(classid, instanceid, price)
+        return {'success': True}
+
+    def update_order(self, account: Account, query, args) -> dict:
+        classid, instanceid, price = args[0], args[1], int(args[2])
+        order = account.orders.get((classid, instanceid))
+        if order is None:
+            return {'success': False, 'error': 'no_order'}
+        if order['o_price'] == price:
+            return {'success': False, 'error': 'same_price'}
+        order['o_price'] = price
+        return {'success': True}
+
+    def process_order(self, account: Account, query, args) -> dict:
+        classid, instanceid, price = args[0], args[1], int(args[2])
+        if price == 0:
+            if account.orders.pop((classid, instanceid), None) is None:
+                return {'success': False, 'error': 'same_price'}
+            return {'success': True, 'way': 'deleted'}
+        account.orders[(classid, instanceid)] = self._order(classid, instanceid, price)
+        return {'success': True, 'way': 'updated'}
+
+    def get_orders(self, account: Account, query, args) -> dict:
+        return {'success': True, 'Orders': list(account.orders.values()) or 'No orders'}
+
+    def my_inventory(self, account: Account, query, args) -> dict:
+        return {'success': True, 'items': list(account.inventory.values())}
+
+    def update_inventory(self, account: Account, query, args) -> dict:
+        return {'success': True}
+
+    def add_to_sale(self, account: Account, query, args) -> dict:
+        item = account.inventory.pop(query.get('id'), None)
+        if item is None:
+            return {'success': False, 'error': 'item_not_in_inventory'}
+        item_id = str(next(self.ids))
+        account.on_sale[item_id] = {
+            'item_id': item_id,
+            'assetid': item['id'],
+            'classid': item['classid'],
+            'instanceid': item['instanceid'],
+            'market_hash_name': item['market_hash_name'],
+            'price': int(query.get('price', 0)) / 100,
+            'currency': 'RUB',
+            'status': '1'
+        }
+        return {'success': True, 'item_id': item_id}
+
+    def items(self, account: Account, query, args) -> dict:
+        # маркет отдаёт null, если выставленных предметов нет
+        return {'success': True, 'items': list(account.on_sale.values()) or None}
+
+    def set_price(self, account: Account, query, args) -> dict:
+        item = account.on_sale.get(query.get('item_id'))
+        if item is None:
+            return {'success': False, 'error': 'bad_item'}
+        price = int(query.get('price', 0))
+        if price == 0:
+            del account.on_sale[item['item_id']]
+            account.inventory[item['assetid']] = {
+                'id': item['assetid'],
+                'classid': item['classid'],
+                'instanceid': item['instanceid'],
+                'market_hash_name': item['market_hash_name'],
+                'market_price': item['price'],
+                'tradable': 1
+            }
+        else:
+            item['price'] = price / 100
+        return {'success': True}
+
+    def trade_request_give_p2p_all(self, account: Account, query, args) -> dict:
+        if not account.sold:
+            return {'success': False, 'error': 'nothing'}
+        sold, account.sold = account.sold, []
+        return {
+            'success': True,
+            'offers': [
+                {
+                    'partner': '1',
+                    'token': 'fake',
+                    'tradeoffermessage': f'fake {item["item_id"]}',
+                    'items': [{'assetid': item['assetid']}]
+                } for item in sold
+            ]
+        }
+
+
+class FakeSteamClient:
+    """
+    Steam-клиент бота, который получает трейды с предметами,
+    купленными по ордерам на FakeMarket, и кладёт их в инвентарь маркета.
+    """
+
+    def __init__(self, market: FakeMarket, secret_key: str, session_alive: bool = True):
+        self.market = market
+        self.secret_key = secret_key
+        self.offers = {}
+        # сессия с cookies, как у steampy.SteamClient, для проверки сохранения сессии
+        self._session = requests.Session()
+        self.session_alive = session_alive
+        self.was_login_executed = False
+        self.username = None
+        self.steam_guard_string = None
+        self.steam_guard = None
+
+    def set_login_cookies(self, cookies: dict):
+        self._session.cookies.update(cookies)
+        self.was_login_executed = True
+
+    def is_session_alive(self) -> bool:
+        return self.session_alive
+
+    def logout(self):
+        pass
+
+    def get_trade_offers(self) -> dict:
+        account = self.market.account(self.secret_key)
+        incoming, account.incoming = account.incoming, []
+        for item in incoming:
+            assetid = str(next(self.market.ids))
+            self.offers[assetid] = dict(item, id=assetid, tradable=1)
+        return {
+            'response': {
+                'trade_offers_received': [
+                    {
+                        'tradeofferid': assetid,
+                        'items_to_receive': {assetid: {'market_hash_name': item['market_hash_name']}},
+                        'items_to_give': {},
+                        'trade_offer_state': TradeOfferState.Active,
+                        'is_our_offer': False
+                    } for assetid, item in self.offers.items()
+                ]
+            }
+        }
+
+    def accept_trade_offer(self, trade_offer_id: str) -> dict:
+        item = self.offers.pop(trade_offer_id)
+        self.market.account(self.secret_key).inventory[item['id']] = item
+        return {'tradeid': trade_offer_id}
+
+    def make_offer_with_url(self, *args, **kwargs) -> dict:
+        return {'tradeofferid': str(next(self.market.ids))}
+
+
+async def serve(market: FakeMarket, host: str, port: int):
+    url = await market.start(host, port)
+    print(f'Fake market is running on {url}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await market.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rps', type=float, default=None)
+    parser.add_argument('--fill-rate', type=float, default=0.0)
+    parser.add_argument('--sell-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(
+            FakeMarket(
+                latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                rps=args.rps, fill_rate=args.fill_rate, sell_rate=args.sell_rate
+            ),
+            args.host,
+            args.port
+        ))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,205 @@
+import queue
+import asyncio
+
+import aiohttp
+
+import market.actors as actors
+from core.scheduler import Scheduler
+from market.models import Bot
+from market.utils import sessions
+
+
+def quiet_jobs(monkeypatch) -> list:
+    """Задачи актора ничего не делают, проверки статуса записываются в список."""
+    checks = []
+
+    async def bot_states_check(bot):
+        checks.append(bot.state)
+        return True
+
+    async def nothing(bot):
+        pass
+
+    monkeypatch.setattr(actors, 'bot_states_check', bot_states_check)
+    for name in ('bot_sell', 'bot_buy', 'update_orders_price', 'update_sell_price', 'take_items', 'give_items'):
+        monkeypatch.setattr(actors, name, nothing)
+    monkeypatch.setattr(actors, 'actors', {})
+    return checks
+
+
+async def wait_for(condition, timeout: float = 2):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError('condition was not met')
+
+
+def new_bot(number: int, **values) -> Bot:
+    return Bot(
+        state='active', secret_key=f'secret {number}', api_key=f'api {number}',
+        username=f'user {number}', password='password', steamguard_file=f'guard {number}.json',
+        **values
+    )
+
+
+async def create_bot(number: int) -> Bot:
+    return await new_bot(number).save()
+
+
+def test_state_from_another_thread_triggers_states(monkeypatch):
+    checks = quiet_jobs(monkeypatch)
+
+    async def run():
+        monkeypatch.setattr(actors, 'actors_loop', asyncio.get_running_loop())
+        actor = actors.BotActor(new_bot(1, id=1))
+        actors.actors[1] = actor
+        actor.start()
+        await wait_for(lambda: checks == ['active'])
+
+        # так статус передают обработчики telegram
+        await asyncio.get_running_loop().run_in_executor(None, actors.send_bot_state, '1', 'sell')
+        await wait_for(lambda: len(checks) == 2)
+
+        actor.send('stop')
+        await actor.task
+        return actor
+
+    actor = asyncio.run(run())
+    assert checks == ['active', 'sell']
+    assert actor.bot.state == 'sell'
+    assert all(job.task.done() for job in actor.scheduler.jobs.values())
+
+
+def test_removed_bots_are_stopped(db, monkeypatch):
+    quiet_jobs(monkeypatch)
+
+    async def run():
+        async with db:
+            first, second = await create_bot(1), await create_bot(2)
+            await actors.sync_actors()
+            started = set(actors.actors)
+            session = sessions[second.id] = aiohttp.ClientSession()
+            stopped = actors.actors[second.id]
+
+            await second.delete()
+            await actors.sync_actors()
+            await stopped.task
+
+            remaining = set(actors.actors)
+            for actor in list(actors.actors.values()):
+                actor.send('stop')
+                await actor.task
+            return (first.id, second.id), started, remaining, session
+
+    (first, second), started, remaining, session = asyncio.run(run())
+    assert started == {first, second}
+    assert remaining == {first}
+    assert session.closed and second not in sessions
+
+
+def test_changed_bot_is_sent_to_actor(db, monkeypatch):
+    checks = quiet_jobs(monkeypatch)
+
+    async def run():
+        async with db:
+            bot = await create_bot(1)
+            await actors.sync_actors()
+            actor = actors.actors[bot.id]
+            await wait_for(lambda: checks == ['active'])
+
+            # статус изменён в базе в обход send_bot_state
+            await bot.update(state='sell')
+            await actors.sync_actors()
+            await wait_for(lambda: len(checks) == 2)
+
+            actor.send('stop')
+            await actor.task
+
+    asyncio.run(run())
+    assert checks == ['active', 'sell']
+
+
+def test_missing_actor_triggers_sync(monkeypatch):
+    quiet_jobs(monkeypatch)
+
+    async def sync_actors():
+        pass
+
+    async def run():
+        main = Scheduler()
+        job = main.add_job('sync_actors', sync_actors, 60)
+        monkeypatch.setattr(actors, 'scheduler', main)
+        monkeypatch.setattr(actors, 'actors_loop', asyncio.get_running_loop())
+        actors.send_bot_state(5, 'buy')
+        await asyncio.sleep(0)
+        return job.wakeup.event.is_set()
+
+    assert asyncio.run(run())
+
+
+def test_shards_split_bots(monkeypatch):
+    monkeypatch.setattr(actors, 'shard_count', 3)
+    shards = []
+    for index in range(3):
+        monkeypatch.setattr(actors, 'shard_index', index)
+        shards.append({bot_id for bot_id in range(1, 10) if actors.in_shard(bot_id)})
+
+    assert shards == [{3, 6, 9}, {1, 4, 7}, {2, 5, 8}]
+
+
+def test_actors_are_started_only_for_own_shard(db, monkeypatch):
+    quiet_jobs(monkeypatch)
+    monkeypatch.setattr(actors, 'shard_count', 2)
+    monkeypatch.setattr(actors, 'shard_index', 1)
+
+    async def run():
+        async with db:
+            bots = [await create_bot(number) for number in range(4)]
+            await actors.sync_actors()
+            started = set(actors.actors)
+            for actor in list(actors.actors.values()):
+                actor.send('stop')
+                await actor.task
+            return {bot.id for bot in bots if bot.id % 2 == 1}, started
+
+    own, started = asyncio.run(run())
+    assert started == own and len(own) == 2
+
+
+def test_states_are_routed_to_worker_queues(monkeypatch):
+    queues = [queue.Queue() for _ in range(3)]
+    monkeypatch.setattr(actors, 'control_queues', queues)
+
+    actors.send_bot_state('4', 'buy')
+    actors.send_bot_state(6, 'hold')
+
+    assert queues[1].get_nowait() == ('state', 4, 'buy')
+    assert queues[0].get_nowait() == ('state', 6, 'hold')
+    assert queues[2].empty()
+
+
+class Inbox:
+    def __init__(self):
+        self.messages = []
+
+    def send(self, *message):
+        self.messages.append(message)
+
+
+def test_control_queue_delivers_states_until_none(monkeypatch):
+    quiet_jobs(monkeypatch)
+    monkeypatch.setattr(actors, 'scheduler', Scheduler())
+    inbox = Inbox()
+    actors.actors[1] = inbox
+    control = queue.Queue()
+    for message in (('state', 1, 'sell'), ('state', 2, 'buy'), None, ('state', 1, 'hold')):
+        control.put(message)
+
+    async def run():
+        await asyncio.wait_for(actors.listen_control(control), 5)
+
+    asyncio.run(run())
+    # у второго бота нет актора и нет sync_actors в планировщике - сообщение пропускается
+    assert inbox.messages == [('state', 'sell')]
+    assert control.get_nowait() == ('state', 1, 'hold')
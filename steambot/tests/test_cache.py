@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from core.metrics import cache_requests
+from market.cache import TTLCache
+
+
+def test_values_expire_and_are_evicted():
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache.set('old', 0, ttl=-1)
+    assert cache.get('old') is None
+
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    # b дольше всех не использовался
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.stats()['evictions'] == 1
+
+
+def test_concurrent_misses_are_loaded_once():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    async def run():
+        cache = TTLCache(ttl=10, name='test-coalesce')
+        values = await asyncio.gather(*[cache.get_or_load('key', load) for _ in range(5)])
+        values.append(await cache.get_or_load('key', load))
+        return cache, values
+
+    cache, values = asyncio.run(run())
+    assert values == ['value'] * 6
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (5, 1)
+    assert cache_requests.values[('test-coalesce', 'hit')] == 5
+
+
+def test_errors_reach_every_waiter_and_are_not_stored():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError('market is down')
+
+    async def run():
+        cache = TTLCache(ttl=10)
+        results = await asyncio.gather(
+            *[cache.get_or_load('key', fail) for _ in range(3)], return_exceptions=True
+        )
+        return cache, results
+
+    cache, results = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert cache.get('key') is None
+
+
+def test_store_decides_what_is_cached():
+    async def load():
+        return {'error': 'bad key'}
+
+    async def run():
+        cache = TTLCache(ttl=10)
+        await cache.get_or_load('key', load, store=lambda value: 'error' not in value)
+        return cache
+
+    assert asyncio.run(run()).get('key') is None
+
+
+def test_waiters_reload_when_the_loader_is_cancelled():
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return len(loads)
+
+    async def run():
+        cache = TTLCache(ttl=10)
+        owner = asyncio.create_task(cache.get_or_load('key', load))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_load('key', load))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await waiter
+
+    # ожидавший не получил CancelledError, а загрузил значение сам
+    assert asyncio.run(run()) == 2
+
+
+def test_best_buy_offer_caches_only_results_and_missing_orders(monkeypatch):
+    import market.utils as utils
+
+    responses = {
+        '1_0': [{'success': True, 'best_offer': 100}],
+        '2_0': [{'success': False, 'error': 'There are no buy orders for this item'}],
+        '3_0': [{'success': False, 'error': 'internal'}, {'success': True, 'best_offer': 300}],
+    }
+    requests = []
+
+    async def send_request_to_market(bot, url, **kwargs):
+        key = url.rstrip('/').rsplit('/', 1)[1]
+        requests.append(key)
+        return responses[key].pop(0)
+
+    monkeypatch.setattr(utils, 'send_request_to_market', send_request_to_market)
+    monkeypatch.setattr(utils, 'best_buy_offer_cache', TTLCache(ttl=10))
+
+    async def run():
+        results = []
+        for classid in ('1', '2', '3'):
+            for _ in range(2):
+                results.append(await utils.best_buy_offer(None, classid, '0'))
+        return results
+
+    results = asyncio.run(run())
+    assert requests == ['1_0', '2_0', '3_0', '3_0']
+    assert results[5] == {'success': True, 'best_offer': 300}
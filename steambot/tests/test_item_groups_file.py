@@ -0,0 +1,79 @@
+import json
+import asyncio
+import tempfile
+
+import pytest
+
+pytest.importorskip('telegram.ext')
+
+from market.models import Bot, ItemGroup  # noqa: E402
+from telegram_bot.command_handlers import import_states, parse_item_groups, write_item_groups  # noqa: E402
+
+
+def test_csv_rows():
+    data = (
+        'market_hash_name,state,amount,min_sell_price\n'
+        'AK-47 | Redline,,,\n'
+        'AWP | Asiimov,disabled,0,150\n'
+    ).encode()
+    rows, errors = parse_item_groups('groups.csv', data)
+    assert errors == []
+    assert rows == [
+        {'market_hash_name': 'AK-47 | Redline', 'state': 'active', 'amount': 1, 'min_sell_price': 0},
+        {'market_hash_name': 'AWP | Asiimov', 'state': 'disabled', 'amount': 0, 'min_sell_price': 150},
+    ]
+
+
+@pytest.mark.parametrize('amount', [1.5, 2.0, True, '1.5', -1, '-1', [1], 'x'])
+def test_json_amount_must_be_integer(amount):
+    data = json.dumps([{'market_hash_name': 'a', 'amount': amount}]).encode()
+    rows, errors = parse_item_groups('groups.json', data)
+    assert rows == []
+    assert errors == ['1: amount and min_sell_price must be non-negative integers']
+
+
+def test_wrong_rows_are_reported():
+    data = json.dumps([
+        {'market_hash_name': 'a'},
+        {'market_hash_name': 'a'},
+        {'market_hash_name': ''},
+        {'market_hash_name': 'b', 'state': 'delete'},
+        'c',
+    ]).encode()
+    rows, errors = parse_item_groups('groups.json', data)
+    assert [row['market_hash_name'] for row in rows] == ['a']
+    assert errors == [
+        '2: a is repeated', '3: market_hash_name is empty', '4: wrong state delete', '5: row must be an object'
+    ]
+
+
+def test_json_must_be_list():
+    with pytest.raises(ValueError):
+        parse_item_groups('groups.json', b'{}')
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'json'])
+def test_export_can_be_imported(db, file_format):
+    async def run():
+        async with db:
+            bot = await Bot.objects.create(
+                state='active', secret_key='secret', api_key='api', username='user',
+                password='password', steamguard_file='guard.json'
+            )
+            for number, state in enumerate(import_states + ('delete',)):
+                await ItemGroup.objects.create(
+                    bot=bot, market_hash_name=f'item {number}', state=state,
+                    amount=number, to_order_amount=number, min_sell_price=number * 10
+                )
+            # тот же файл, что и в export_item_groups
+            with tempfile.TemporaryFile() as file:
+                count = await write_item_groups(file, bot, file_format)
+                file.seek(0)
+                return count, file.read()
+
+    count, data = asyncio.run(run())
+    rows, errors = parse_item_groups(f'groups.{file_format}', data)
+    assert errors == []
+    assert count == len(rows) == len(import_states)
+    assert [row['state'] for row in rows] == list(import_states)
+    assert [row['amount'] for row in rows] == list(range(len(import_states)))
@@ -0,0 +1,55 @@
+import queue
+import logging
+import threading
+from logging.handlers import QueueListener
+
+from logs.logger import RawQueueHandler, Summary
+
+
+class Recorder(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class Payload:
+    """Запоминает поток, в котором сообщение было отформатировано."""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread())
+        return 'payload'
+
+
+def test_records_are_formatted_in_listener_thread():
+    log_queue = queue.SimpleQueue()
+    recorder = Recorder()
+    listener = QueueListener(log_queue, recorder)
+    logger = logging.getLogger('tests.logger')
+    logger.propagate = False
+    handler = RawQueueHandler(log_queue)
+    logger.addHandler(handler)
+    payload = Payload()
+    listener.start()
+    try:
+        logger.warning('Response: %s', payload)
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            logger.exception('Failed')
+    finally:
+        listener.stop()
+        logger.removeHandler(handler)
+
+    assert payload.threads and threading.current_thread() not in payload.threads
+    assert recorder.messages[0] == 'Response: payload'
+    assert 'ValueError: boom' in recorder.messages[1]
+
+
+def test_summary_replaces_collections_with_sizes():
+    assert str(Summary({'items': [1, 2], 'success': True})) == "{'items': <2 items>, 'success': True}"
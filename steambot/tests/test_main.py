@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip('telegram.ext')
+
+from core import main  # noqa: E402
+from core.scheduler import Scheduler  # noqa: E402
+
+
+@pytest.mark.parametrize('telegram, actors, jobs', [
+    (True, True, {'sync_actors', 'load_allowed_users'}),
+    (True, False, {'load_allowed_users'}),
+    (False, True, {'sync_actors'}),
+])
+def test_register_jobs(monkeypatch, telegram, actors, jobs):
+    monkeypatch.setattr(main, 'scheduler', Scheduler())
+    monkeypatch.setattr(main, 'allowed_users_refresh', 300)
+    main.register_jobs(telegram, actors)
+    assert set(main.scheduler.jobs) == jobs
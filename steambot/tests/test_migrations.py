@@ -0,0 +1,48 @@
+import sqlalchemy
+
+from core.database import metadata, SQLiteConnection
+from core.migrations import migrate, migrations, schema_version
+from market import models  # noqa: F401 - модели регистрируют таблицы в metadata
+
+
+def old_database(path) -> sqlalchemy.engine.Engine:
+    """База, созданная до появления индексов в моделях."""
+    engine = sqlalchemy.create_engine(f'sqlite:///{path}', connect_args={'factory': SQLiteConnection})
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(bind=connection)
+    return engine
+
+
+def model_indexes() -> set:
+    return {index.name for table in metadata.sorted_tables for index in table.indexes}
+
+
+def database_indexes(engine) -> set:
+    inspector = sqlalchemy.inspect(engine)
+    return {
+        index['name']
+        for table in metadata.sorted_tables
+        for index in inspector.get_indexes(table.name)
+    }
+
+
+def test_migrate_creates_missing_indexes(tmp_path):
+    engine = old_database(tmp_path / 'old.db')
+    assert model_indexes()
+    assert not database_indexes(engine) & model_indexes()
+
+    assert migrate(engine) == migrations[-1][0]
+    assert model_indexes() <= database_indexes(engine)
+
+
+def test_migrate_is_idempotent(tmp_path):
+    engine = old_database(tmp_path / 'old.db')
+    version = migrate(engine)
+    assert migrate(engine) == version
+
+    with engine.connect() as connection:
+        versions = connection.execute(sqlalchemy.select(schema_version.c.version)).scalars().all()
+    assert versions == [number for number, _, _ in migrations]
@@ -0,0 +1,136 @@
+import asyncio
+from collections import Counter
+
+from market.models import Bot, ItemGroup, get_groups_by_hash_names, increment_to_order_amount
+
+
+async def create_bot(number: int = 1) -> Bot:
+    return await Bot.objects.create(
+        state='active', secret_key=f'secret {number}', api_key=f'api {number}',
+        username=f'user {number}', password='password', steamguard_file=f'guard {number}.json'
+    )
+
+
+async def create_groups(bot: Bot, count: int, amount: int = 10, to_order_amount: int = 0) -> list:
+    return [
+        await ItemGroup.objects.create(
+            bot=bot, state='active', market_hash_name=f'item {number}',
+            amount=amount, to_order_amount=to_order_amount
+        )
+        for number in range(count)
+    ]
+
+
+def count_queries(database, monkeypatch) -> list:
+    """Запросы, выполненные через database.execute и database.fetch_all."""
+    queries = []
+    for name in ('execute', 'fetch_all'):
+        method = getattr(database, name)
+
+        async def wrapper(query, *args, method=method, **kwargs):
+            queries.append(query)
+            return await method(query, *args, **kwargs)
+
+        monkeypatch.setattr(database, name, wrapper)
+    return queries
+
+
+def test_groups_are_loaded_in_one_query(db, monkeypatch):
+    async def run():
+        async with db:
+            bot, other = await create_bot(1), await create_bot(2)
+            await create_groups(bot, 3)
+            await ItemGroup.objects.create(
+                bot=other, state='active', market_hash_name='other', to_order_amount=0
+            )
+            queries = count_queries(db, monkeypatch)
+            groups = await get_groups_by_hash_names(['item 0', 'item 2', 'item 2', 'missing', 'other'], bot)
+            empty = await get_groups_by_hash_names([])
+            return groups, empty, len(queries)
+
+    groups, empty, queries = asyncio.run(run())
+    assert sorted(groups) == ['item 0', 'item 2']
+    assert groups['item 2'].market_hash_name == 'item 2'
+    assert empty == {}
+    assert queries == 1
+
+
+def test_trade_of_50_items_is_one_update(db, monkeypatch):
+    # 50 предметов пяти групп: по 10 каждой
+    received = Counter(f'item {number % 5}' for number in range(50))
+    received['missing'] = 3
+
+    async def run():
+        async with db:
+            bot = await create_bot()
+            await create_groups(bot, 6, amount=10)
+            queries = count_queries(db, monkeypatch)
+            await increment_to_order_amount(received)
+            executed = len(queries)
+            groups = await ItemGroup.objects.order_by('id').all()
+            return executed, {group.market_hash_name: group.to_order_amount for group in groups}
+
+    executed, amounts = asyncio.run(run())
+    assert executed == 1
+    assert amounts == {
+        'item 0': 10, 'item 1': 10, 'item 2': 10, 'item 3': 10, 'item 4': 10, 'item 5': 0
+    }
+    assert 'missing' not in amounts
+
+
+def test_increment_is_capped_by_amount_and_bot(db):
+    async def run():
+        async with db:
+            bot, other = await create_bot(1), await create_bot(2)
+            await create_groups(bot, 2, amount=5, to_order_amount=3)
+            await ItemGroup.objects.create(
+                bot=other, state='active', market_hash_name='other', amount=5, to_order_amount=0
+            )
+            await increment_to_order_amount({'item 0': 1, 'item 1': 4, 'other': 2, '': 1}, bot)
+            # пустой словарь и нулевые значения не выполняют запросов
+            await increment_to_order_amount({'item 0': 0})
+            groups = await ItemGroup.objects.all()
+            return {group.market_hash_name: group.to_order_amount for group in groups}
+
+    assert asyncio.run(run()) == {'item 0': 4, 'item 1': 5, 'other': 0}
+
+
+def test_to_order_amount_stays_between_zero_and_amount(db):
+    async def run():
+        async with db:
+            group, = await create_groups(await create_bot(), 1, amount=5, to_order_amount=3)
+            stale = await ItemGroup.objects.get(id=group.id)
+            results = []
+            for change in (4, -2, -10, 1):
+                await group.add_to_order_amount(change)
+                stored = await ItemGroup.objects.get(id=group.id)
+                results.append((group.to_order_amount, stored.to_order_amount))
+            # устаревшая копия не затирает изменения, сделанные через другую копию
+            await stale.add_to_order_amount(2, min_sell_price=0)
+            stored = await ItemGroup.objects.get(id=group.id)
+            return results, stored
+
+    results, stored = asyncio.run(run())
+    assert results == [(5, 5), (3, 3), (0, 0), (1, 1)]
+    assert (stored.to_order_amount, stored.min_sell_price) == (3, 0)
+
+
+def test_min_sell_price_is_never_lowered(db):
+    async def run():
+        async with db:
+            group, = await create_groups(await create_bot(), 1)
+            await group.update(min_sell_price=500)
+            stale = await ItemGroup.objects.get(id=group.id)
+            results = []
+            for price in (700, 600, 700):
+                await group.raise_min_sell_price(price)
+                stored = await ItemGroup.objects.get(id=group.id)
+                results.append((group.min_sell_price, stored.min_sell_price))
+            # копия со старым значением тоже не может понизить цену в базе
+            await stale.raise_min_sell_price(550)
+            stored = await ItemGroup.objects.get(id=group.id)
+            return results, stored.min_sell_price
+
+    results, stored_price = asyncio.run(run())
+    assert results == [(700, 700), (700, 700), (700, 700)]
+    assert stored_price == 700
@@ -0,0 +1,125 @@
+import asyncio
+
+import market.utils as utils
+from market.models import Bot, ItemGroup
+from market.utils import BalanceSnapshot, OrderBook, delete_orders, update_bots_orders
+
+
+def order(hash_name: str, classid: str, price: int = 1000) -> dict:
+    return {
+        'i_market_hash_name': hash_name, 'i_classid': classid, 'i_instanceid': '0', 'o_price': price
+    }
+
+
+async def create_group(**values) -> ItemGroup:
+    bot = await Bot.objects.create(
+        state='active', secret_key='secret', api_key='api', username='user',
+        password='password', steamguard_file='guard.json'
+    )
+    return await ItemGroup.objects.create(bot=bot, state='active', **values)
+
+
+def test_order_book_indexes():
+    book = OrderBook([order('a', '1'), order('a', '2'), order('b', '3')])
+    assert len(book) == 3
+    assert [item['i_classid'] for item in book.for_hash_name('a')] == ['1', '2']
+    assert book.for_hash_name('c') == []
+    assert book.get('3', '0')['i_market_hash_name'] == 'b'
+    assert book.get('3', '1') is None
+
+
+def test_cancelled_orders_are_returned_when_retry_finds_no_orders(db, monkeypatch):
+    books = [OrderBook([order('a', '1'), order('a', '2')]), None]
+    responses = [{'success': True}, {'error': 'internal'}]
+
+    async def get_order_book(bot):
+        return books.pop(0)
+
+    async def send_request_to_market(bot, url, **kwargs):
+        return responses.pop(0)
+
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(utils, 'get_order_book', get_order_book)
+    monkeypatch.setattr(utils, 'send_request_to_market', send_request_to_market)
+    monkeypatch.setattr(utils.asyncio, 'sleep', no_sleep)
+
+    async def run():
+        async with db:
+            group = await create_group(
+                market_hash_name='a', amount=3, to_order_amount=1, min_sell_price=500
+            )
+            await delete_orders(group.bot, group)
+            return await ItemGroup.objects.get(id=group.id)
+
+    group = asyncio.run(run())
+    # первый ордер отменён до ошибки и возвращён в to_order_amount
+    assert (group.to_order_amount, group.min_sell_price) == (2, 0)
+
+
+def test_group_is_kept_when_orders_are_not_loaded(db, monkeypatch):
+    async def get_order_book(bot):
+        return None
+
+    monkeypatch.setattr(utils, 'get_order_book', get_order_book)
+
+    async def run():
+        async with db:
+            group = await create_group(
+                market_hash_name='a', amount=3, to_order_amount=1, min_sell_price=900
+            )
+            await delete_orders(group.bot, group)
+            return await ItemGroup.objects.get(id=group.id)
+
+    group = asyncio.run(run())
+    # цена, ниже которой бот не продаёт, не сбрасывается
+    assert (group.to_order_amount, group.min_sell_price) == (1, 900)
+
+
+def test_balance_snapshot_keeps_a_ruble():
+    balance = BalanceSnapshot(1000)
+    assert balance.reserve(800)
+    assert not balance.reserve(150)
+    balance.release(800)
+    assert balance.money == 1000
+
+
+def test_orders_update_reads_balance_once_per_pass(db, monkeypatch):
+    book = OrderBook([order('a', '1', 1000), order('b', '2', 1000), order('c', '3', 1000)])
+    balance_requests = []
+    updates = []
+
+    async def get_order_book(bot):
+        return book
+
+    async def best_buy_offer(bot, classid, instanceid):
+        return {'best_offer': 1500}
+
+    async def search_item_by_hash_name(bot, hash_name):
+        return {'data': [{'price': 5000}]}
+
+    async def bot_balance(bot):
+        balance_requests.append(bot.id)
+        return 1000
+
+    async def send_request_to_market(bot, url, **kwargs):
+        updates.append(url)
+        return {'success': True}
+
+    monkeypatch.setattr(utils, 'get_order_book', get_order_book)
+    monkeypatch.setattr(utils, 'best_buy_offer', best_buy_offer)
+    monkeypatch.setattr(utils, 'search_item_by_hash_name', search_item_by_hash_name)
+    monkeypatch.setattr(utils, 'bot_balance', bot_balance)
+    monkeypatch.setattr(utils, 'send_request_to_market', send_request_to_market)
+
+    async def run():
+        async with db:
+            group = await create_group(market_hash_name='a', amount=1, to_order_amount=0)
+            await update_bots_orders(group.bot)
+            return await ItemGroup.objects.get(id=group.id)
+
+    group = asyncio.run(run())
+    assert len(balance_requests) == 1
+    assert len(updates) == 3
+    assert group.min_sell_price == 1501
@@ -0,0 +1,69 @@
+import asyncio
+
+from market.rate_limit import TokenBucket, PRIORITY_TRADE, PRIORITY_SCAN
+
+
+async def take_all(bucket: TokenBucket):
+    for _ in range(bucket.capacity):
+        await bucket.acquire()
+
+
+def test_waiters_get_tokens_in_arrival_order():
+    async def run():
+        bucket = TokenBucket(rate=200, capacity=1)
+        await take_all(bucket)
+        order = []
+
+        async def waiter(number: int):
+            await bucket.acquire()
+            order.append(number)
+
+        await asyncio.gather(*[waiter(number) for number in range(30)])
+        return order
+
+    assert asyncio.run(run()) == list(range(30))
+
+
+def test_higher_priority_goes_first():
+    async def run():
+        bucket = TokenBucket(rate=100, capacity=1)
+        await take_all(bucket)
+        order = []
+
+        async def waiter(name: str, priority: int):
+            await bucket.acquire(priority)
+            order.append(name)
+
+        scan = [asyncio.create_task(waiter(f'scan{i}', PRIORITY_SCAN)) for i in range(3)]
+        await asyncio.sleep(0)
+        trade = asyncio.create_task(waiter('trade', PRIORITY_TRADE))
+        await asyncio.gather(*scan, trade)
+        return order
+
+    assert asyncio.run(run()) == ['trade', 'scan0', 'scan1', 'scan2']
+
+
+def test_cancelled_waiter_does_not_hold_the_queue():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        await take_all(bucket)
+        first = asyncio.create_task(bucket.acquire())
+        second = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.wait_for(second, 1)
+        return first.cancelled()
+
+    assert asyncio.run(run())
+
+
+def test_throttle_blocks_the_key():
+    async def run():
+        bucket = TokenBucket(rate=1000, capacity=5)
+        bucket.throttle(0.2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await bucket.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(run()) >= 0.19
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from core.metrics import job_failures, job_last_run, render
+from core.scheduler import Job, Scheduler
+
+
+async def noop():
+    pass
+
+
+def test_delay_has_jitter_within_bounds():
+    job = Job('job', noop, 10, jitter=0.1)
+    delays = [job.next_delay() for _ in range(200)]
+    assert all(10 <= delay <= 11 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_failures_back_off_exponentially_up_to_the_limit():
+    job = Job('job', noop, 10, jitter=0, max_backoff=60)
+    job.consecutive_failures = 1
+    assert job.next_delay() == 20
+    job.consecutive_failures = 2
+    assert job.next_delay() == 40
+    job.consecutive_failures = 10
+    assert job.next_delay() == 60
+
+
+def test_failed_run_is_counted_and_success_resets_backoff():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError('market is down')
+
+    async def run():
+        job = Job('flaky', flaky, 10)
+        for _ in range(3):
+            await job.run_once()
+        return job
+
+    job = asyncio.run(run())
+    assert (job.runs, job.failures, job.consecutive_failures) == (3, 2, 0)
+    assert 'market is down' in job.last_error
+
+
+def test_job_runs_are_exported_to_metrics():
+    async def failing():
+        raise RuntimeError('market is down')
+
+    async def run():
+        job = Job('exported', failing, 10, owner='tests')
+        await job.run_once()
+        return job
+
+    job = asyncio.run(run())
+    labels = ('tests', 'exported')
+    assert job_last_run.values[labels] == job.last_run.timestamp()
+    assert job_failures.values[labels] == 1
+    assert 'job_last_run_timestamp_seconds{scheduler="tests",job="exported"}' in render()
+
+
+def test_trigger_runs_job_before_its_interval():
+    runs = []
+
+    async def run():
+        scheduler = Scheduler('test')
+
+        async def job():
+            runs.append(1)
+
+        scheduler.add_job('job', job, 3600)
+        scheduler.start()
+        await asyncio.sleep(0.01)
+        scheduler.trigger('job')
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert len(runs) == 2
+
+
+def test_stop_cancels_running_jobs():
+    async def run():
+        scheduler = Scheduler('test')
+
+        async def slow():
+            await asyncio.sleep(3600)
+
+        scheduler.add_job('slow', slow, 1)
+        scheduler.start()
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(scheduler.stop(), 1)
+        return scheduler.jobs['slow'].task
+
+    assert asyncio.run(run()).cancelled()
+
+
+def test_jobs_are_registered_once():
+    scheduler = Scheduler('test')
+    scheduler.add_job('job', noop, 1)
+    with pytest.raises(ValueError):
+        scheduler.add_job('job', noop, 1)
@@ -0,0 +1,90 @@
+import os
+import json
+import asyncio
+
+import pytest
+
+import market.steam as steam
+from market.models import Bot
+from tests.fake_market import FakeMarket, FakeSteamClient
+
+
+def make_bot(tmp_path) -> Bot:
+    steamguard_file = tmp_path / 'guard.json'
+    steamguard_file.write_text(json.dumps({
+        'steamid': '76561190000000000', 'shared_secret': 'c2VjcmV0', 'identity_secret': 'c2VjcmV0'
+    }))
+    return Bot(
+        id=1, state='active', secret_key='secret', api_key='api', username='user',
+        password='password', steamguard_file=str(steamguard_file)
+    )
+
+
+def logged_in_client(market: FakeMarket) -> FakeSteamClient:
+    client = FakeSteamClient(market, 'secret')
+    client._session.cookies.set('sessionid', 'abc', domain='steamcommunity.com', path='/')
+    client._session.cookies.set('steamLoginSecure', 'token', domain='steamcommunity.com', path='/')
+    client.was_login_executed = True
+    return client
+
+
+def test_session_is_saved_and_restored(tmp_path, monkeypatch):
+    monkeypatch.setattr(steam, 'sessions_dir', tmp_path / 'sessions')
+    bot = make_bot(tmp_path)
+    market = FakeMarket()
+
+    steam.save_steam_session(bot.id, logged_in_client(market))
+    session_file = steam._session_file(bot.id)
+    assert oct(os.stat(session_file).st_mode & 0o777) == '0o600'
+
+    client = FakeSteamClient(market, 'secret')
+    assert steam.restore_steam_session(bot, client)
+    assert client.was_login_executed
+    assert client.username == 'user'
+    assert client.steam_guard['steamid'] == '76561190000000000'
+    cookies = {(cookie.name, cookie.domain): cookie.value for cookie in client._session.cookies}
+    assert cookies == {
+        ('sessionid', 'steamcommunity.com'): 'abc',
+        ('steamLoginSecure', 'steamcommunity.com'): 'token',
+    }
+
+
+def test_expired_session_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(steam, 'sessions_dir', tmp_path / 'sessions')
+    bot = make_bot(tmp_path)
+    market = FakeMarket()
+
+    steam.save_steam_session(bot.id, logged_in_client(market))
+    client = FakeSteamClient(market, 'secret', session_alive=False)
+    assert not steam.restore_steam_session(bot, client)
+    assert not client.was_login_executed
+    assert not list(client._session.cookies)
+    assert not steam._session_file(bot.id).exists()
+
+
+def test_missing_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(steam, 'sessions_dir', tmp_path / 'sessions')
+    assert not steam.restore_steam_session(make_bot(tmp_path), FakeSteamClient(FakeMarket(), 'secret'))
+
+
+def test_failed_login_is_raised_to_the_job(tmp_path, monkeypatch):
+    calls = []
+
+    def login(bot):
+        calls.append(bot.id)
+        raise RuntimeError('wrong password')
+
+    monkeypatch.setattr(steam, 'login_steam_client', login)
+    bot = make_bot(tmp_path)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await steam.get_bot_steam_client(bot)
+        # блокировка бота отпущена, следующая попытка сразу логинится снова
+        assert not steam.get_steam_lock(bot.id).locked()
+        with pytest.raises(RuntimeError):
+            await steam.get_bot_steam_client(bot)
+
+    asyncio.run(run())
+    assert calls == [1, 1]
+    assert bot.id not in steam.steam_clients
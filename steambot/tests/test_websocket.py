@@ -0,0 +1,92 @@
+import asyncio
+
+import market.websocket as websocket
+from core.scheduler import Scheduler
+from market.models import Bot
+from market.websocket import MarketWebsocket, event_targets, poll_interval
+from tests.fake_market import FakeMarket
+
+
+def make_bot() -> Bot:
+    return Bot(
+        id=1, state='active', secret_key='secret', api_key='api', username='user',
+        password='password', steamguard_file='guard.json'
+    )
+
+
+async def wait_for(condition, timeout: float = 2):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, 'timed out'
+        await asyncio.sleep(0.01)
+
+
+def test_event_triggers_mapped_jobs():
+    async def run():
+        market = FakeMarket()
+        await market.start()
+        account = market.account('secret')
+
+        async def auth_token() -> str:
+            return market.get_ws_auth(account, {}, [])['wsAuth']
+
+        runs = {'take_items': 0, 'update_orders_price': 0, 'sell': 0}
+        scheduler = Scheduler('test')
+        for name in runs:
+            async def job(name=name):
+                runs[name] += 1
+            scheduler.add_job(name, job, 3600)
+        scheduler.start()
+
+        def wake(job: str):
+            if job in scheduler.jobs:
+                scheduler.trigger(job)
+
+        client = asyncio.create_task(
+            MarketWebsocket(make_bot(), on_event=wake, url=market.ws_url, auth_token=auth_token).run()
+        )
+        try:
+            await wait_for(lambda: account.sockets and all(runs.values()))
+            market.push(account, {'type': 'itemout_new_go', 'data': 'AK-47 | Redline'})
+            await wait_for(lambda: runs['take_items'] == 2 and runs['update_orders_price'] == 2)
+            # задачи, не связанные с событием, не запускаются
+            await asyncio.sleep(0.05)
+            assert runs['sell'] == 1
+        finally:
+            client.cancel()
+            await asyncio.gather(client, return_exceptions=True)
+            await scheduler.stop()
+            await market.stop()
+
+    asyncio.run(run())
+
+
+def test_dispatch_ignores_unknown_events():
+    events = []
+    client = MarketWebsocket(make_bot(), on_event=events.append)
+    client.dispatch({'type': 'itemstatus_go'})
+    client.dispatch({'type': 'newitems_go'})
+    assert events == list(event_targets['itemstatus_go'])
+
+
+def test_unreachable_websocket_keeps_reconnecting():
+    async def run():
+        client = asyncio.create_task(MarketWebsocket(
+            make_bot(), on_event=lambda job: None, url='ws://127.0.0.1:9/ws/',
+            auth_token=lambda: asyncio.sleep(0, 'token')
+        ).run())
+        await asyncio.sleep(0.2)
+        alive = not client.done()
+        client.cancel()
+        await asyncio.gather(client, return_exceptions=True)
+        return alive
+
+    assert asyncio.run(run())
+
+
+def test_polling_is_only_a_sweep_in_push_mode(monkeypatch):
+    monkeypatch.setattr(websocket, 'push_mode', False)
+    assert poll_interval(5, 60) == 5
+    monkeypatch.setattr(websocket, 'push_mode', True)
+    assert poll_interval(5, 60) == 60
@@ -0,0 +1,40 @@
+import asyncio
+
+from core import workers
+from core.workers import Worker, check_workers
+
+
+class Process:
+    def __init__(self, alive: bool, exitcode=None):
+        self.alive = alive
+        self.exitcode = exitcode
+        self.pid = 100
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+
+def test_worker_environ(monkeypatch):
+    monkeypatch.setattr(workers, 'log_file', '/var/log/steambot/main_logs.log')
+    monkeypatch.setattr(workers, 'metrics_port', 9100)
+
+    assert Worker(2, 4).environ() == {
+        'SHARD_INDEX': '2',
+        'SHARD_COUNT': '4',
+        'LOG_FILE': '/var/log/steambot/main_logs.worker2.log',
+        'METRICS_PORT': '9103',
+    }
+
+    monkeypatch.setattr(workers, 'metrics_port', 0)
+    assert Worker(0, 4).environ()['METRICS_PORT'] == '0'
+
+
+def test_only_dead_workers_are_restarted(monkeypatch):
+    started = []
+    monkeypatch.setattr(Worker, 'start', lambda worker: started.append(worker.index))
+
+    alive, dead = Worker(0, 2), Worker(1, 2)
+    alive.process, dead.process = Process(True), Process(False, exitcode=1)
+    asyncio.run(check_workers([alive, dead]))
+
+    assert started == [1]